@@ -0,0 +1,331 @@
+"""
+    An asyncio facade over IrisWrapped: the blocking native calls run on a thread pool, bounded to the size of an
+    IrisPool, so an event loop can have thousands of lookups in flight without being blocked.
+    Example Usage:
+        async with AsyncIris(IrisPool(2, 16, ip=..., port=...)) as iris:
+            await iris.MyGlob.set((1, 2, 3), 42)
+            print(await iris.MyGlob.get((1, 2, 3)))
+            async with iris.transaction() as tran:      # All the calls of the transaction use one connection.
+                await iris.MyGlob.set((1, 2, 4), 43)
+            async for key, value in iris.MyGlob.iter_all():
+                print(key, value)
+"""
+import time
+import asyncio
+import itertools
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from IrisWrapped import IrisGlobal
+
+
+class AsyncIrisPinned(object):
+    """ A connection held by one task for a while, e.g. for a transaction. Calls on it are run one at a time, and
+        wait for their turn on the event loop, so they never hold more than one executor thread.
+    """
+    def __init__(self, iris):
+        self.iris = iris
+        self.lock = asyncio.Lock()
+
+    async def run(self, executor, fn, *args):
+        async with self.lock:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, self.iris, *args)
+
+
+class AsyncIrisConnection(object):
+    """
+    Supports Syntax like:
+                async with iris.connection():
+                    await iris.MyGlob.lock((1, 2))      # Locks are held by a connection, so they need to be pinned.
+                    await iris.MyGlob.set((1, 2), 42)
+                    await iris.MyGlob.unlock((1, 2))
+    Nested within another connection() or transaction(), the outer pinned connection is used.
+    """
+    def __init__(self, airis):
+        self.airis = airis
+        self.pinned = None
+        self.token = None
+
+    async def __aenter__(self):
+        airis = self.airis
+        self.pinned = airis.pinned.get()
+        if self.pinned is None:
+            await airis.semaphore.acquire()
+            try:
+                iris = await asyncio.get_running_loop().run_in_executor(airis.executor, airis.checkout)
+            except BaseException:
+                airis.semaphore.release()
+                raise
+            self.pinned = AsyncIrisPinned(iris)
+            self.token = airis.pinned.set(self.pinned)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.token is None:
+            return False
+        airis = self.airis
+        airis.pinned.reset(self.token)
+        try:
+            await asyncio.get_running_loop().run_in_executor(airis.executor, airis.pool.checkin, self.pinned.iris)
+        finally:
+            airis.semaphore.release()
+        return False
+
+
+class AsyncIrisTransaction(object):
+    """
+    Supports Syntax like:
+                async with iris.transaction() as tran:
+                    await iris.MyGlob.set((1, 2, 3), 42)
+                    tran.commit()                   # Breaks out and commits transaction
+                    tran.rollback_one()             # Breaks out and rollback_one's tran
+                    await tran.rollback_all()       # Breaks out and rollback_all's tran
+    All the calls made within the transaction, from this task, are run on one pinned connection.
+    """
+    def __init__(self, airis):
+        self.airis = airis
+        self.connection = AsyncIrisConnection(airis)
+        self.trans = None
+
+    async def __aenter__(self):
+        await self.connection.__aenter__()
+        try:
+            self.trans = await self.airis.run(lambda iris: iris.transaction().__enter__())
+        except BaseException as e:
+            await self.connection.__aexit__(type(e), e, e.__traceback__)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            return await self.airis.run(lambda iris: self.trans.__exit__(exc_type, exc_val, exc_tb))
+        finally:
+            await self.connection.__aexit__(exc_type, exc_val, exc_tb)
+
+    def commit(self):
+        self.trans.commit()
+
+    def rollback_one(self):
+        self.trans.rollback_one()
+
+    async def rollback_all(self):
+        await self.airis.run(lambda iris: self.trans.rollback_all())
+
+
+class AsyncIrisGlobal(object):
+    """
+    AsyncIrisGlobal is the awaitable counterpart of IrisGlobal, for a global of name 'global_name' of an AsyncIris.
+        usage:  my_glob = iris.MyGlob                           # or AsyncIrisGlobal(iris, "^MyGlob")
+                await my_glob.set((1,2,3), 42)                  # set ^MyGlob(1,2,3) = 42
+                x = await my_glob.get((1,2,3))                  # set x = ^MyGlob(1,2,3)
+                await my_glob.kill((1,2,3))                     # kill ^MyGlob(1,2,3)
+                await my_glob.increment((1,2), 1)               # $Increment(^MyGlob(1,2))
+                await my_glob.get_many([(1,2,3), (1,2,4)])      # Batched, as IrisGlobal.get_many()
+                async for k,v in my_glob.iteritems((1,2)):      # $Order iterate (key,value) below (1,2)
+                async for k,v in my_glob.iter_all():            # Depth first iterate all (key,value)
+    """
+    def __init__(self, airis, global_name):
+        self.airis = airis
+        self.global_name = global_name
+
+    def name(self):
+        """The string name of this global."""
+        return self.global_name
+
+    def _run(self, method, *args):
+        return self.airis.run(lambda iris: getattr(IrisGlobal(iris, self.global_name), method)(*args))
+
+    async def get(self, key=None):
+        return await self._run("__getitem__", key)
+
+    async def set(self, key=None, value=None):
+        return await self._run("__setitem__", key, value)
+
+    async def kill(self, key=None):
+        return await self._run("kill", key)
+
+    async def increment(self, key=None, value=1):
+        return await self._run("increment", key, value)
+
+    async def data(self, key=None):
+        return await self._run("data", key)
+
+    async def has_value(self, key=None):
+        return await self._run("has_value", key)
+
+    async def has_child(self, key=None):
+        return await self._run("has_child", key)
+
+    async def get_many(self, keys, batch_size=None):
+        return await self._run("get_many", list(keys), batch_size)
+
+    async def set_many(self, items, batch_size=None):
+        return await self._run("set_many", list(items.items() if isinstance(items, dict) else items), batch_size)
+
+    async def kill_many(self, keys, batch_size=None):
+        return await self._run("kill_many", list(keys), batch_size)
+
+    async def lock(self, key=None, lock_mode="", timeout=1):
+        """Lock my_global[subscripts], within 'async with iris.connection()' or 'iris.transaction()'"""
+        self.airis.require_pinned("lock")
+        return await self._run("lock", key, lock_mode, timeout)
+
+    async def unlock(self, key=None, lock_mode=""):
+        """Unlock my_global[subscripts], within 'async with iris.connection()' or 'iris.transaction()'"""
+        self.airis.require_pinned("unlock")
+        return await self._run("unlock", key, lock_mode)
+
+    async def _iterate(self, method, args, chunk):
+        """Run the IrisGlobal iterator 'method' on one connection, fetching 'chunk' items per executor call."""
+        airis = self.airis
+        loop = asyncio.get_running_loop()
+        pinned = airis.pinned.get()
+        owned = pinned is None
+        if owned:
+            await airis.semaphore.acquire()
+            try:
+                pinned = AsyncIrisPinned(await loop.run_in_executor(airis.executor, airis.checkout))
+            except BaseException:
+                airis.semaphore.release()
+                raise
+        try:
+            item_iter = await pinned.run(
+                airis.executor, lambda iris: getattr(IrisGlobal(iris, self.global_name), method)(*args))
+            while True:
+                items = await pinned.run(airis.executor, lambda iris: list(itertools.islice(item_iter, chunk)))
+                for item in items:
+                    yield item
+                if len(items) < chunk:
+                    return
+        finally:
+            if owned:
+                try:
+                    await loop.run_in_executor(airis.executor, airis.pool.checkin, pinned.iris)
+                finally:
+                    airis.semaphore.release()
+
+    def iterkeys(self, key=None, reverse=False, start_from=None, int_key=False, chunk=1000):
+        """Async iterate through keys at my_global(subscript), optionally after a value, or in reverse"""
+        return self._iterate("iterkeys", (key, reverse, start_from, int_key), chunk)
+
+    def itervalues(self, key=None, reverse=False, start_from=None, chunk=1000):
+        """Async iterate through values at my_global(subscript), optionally after a value, or in reverse"""
+        return self._iterate("itervalues", (key, reverse, start_from), chunk)
+
+    def iteritems(self, key=None, reverse=False, start_from=None, int_key=False, chunk=1000):
+        """Async iterate through (key,value) at my_global(subscript), optionally after a value, or in reverse"""
+        return self._iterate("iteritems", (key, reverse, start_from, int_key), chunk)
+
+    def iter_all(self, key=None, chunk=1000):
+        """Async depth first iterate through all (key,value), at and below 'key'."""
+        return self._iterate("iter_all", (key,), chunk)
+
+
+class AsyncIris(object):
+    """
+        AsyncIris runs IrisWrapped calls for asyncio code, on connections of an IrisPool.
+            usage:  async with AsyncIris(IrisPool(2, 16, ip=..., port=...)) as iris:
+                        my_glob = iris.MyGlob                   # AsyncIrisGlobal for ^MyGlob, or iris["MyGlob"]
+                        await my_glob.set((1,2,3), 42)
+                        async with iris.transaction() as tran:
+                            await my_glob.set((1,2,4), 43)
+        The semaphore has one permit per pool connection, taken by each call outside of connection() and
+        transaction() while it runs, and by each pinned connection while it's pinned. So no more connections are in
+        use than the pool holds, and as a pinned connection runs one call at a time, no more executor threads either:
+        further calls wait, without blocking the event loop, for a permit.
+        The connections of the calls outside of connection() and transaction() are kept on one free list shared by
+        all the executor threads, so they don't go through a pool checkout and checkin each, until close() gives them
+        back to the pool. Pinned connections are taken from the free list too, when it isn't empty. A connection
+        whose call failed, or which is found past the pool's max_lifetime or max_idle when reused, goes back through
+        a pool checkin and checkout instead, so it's pinged, rolled back or closed as the pool would.
+    """
+    def __init__(self, pool, executor=None):
+        self.pool = pool
+        self.executor = executor if executor is not None else \
+            ThreadPoolExecutor(max_workers=pool.max_size, thread_name_prefix="AsyncIris")
+        self.semaphore = asyncio.Semaphore(pool.max_size)
+        self.pinned = contextvars.ContextVar("AsyncIris.pinned", default=None)
+        self.globals = {}
+        self.free = deque()         # (iris, opened, last_used) checked out of the pool, free for the next call.
+        self.mutex = threading.Lock()
+
+    def __getattr__(self, name) -> AsyncIrisGlobal:
+        """Implement iris.<globalname>"""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name) -> AsyncIrisGlobal:
+        """Implement iris["<globalname>"]"""
+        glob = self.globals.get(name)
+        if glob is None:
+            glob = self.globals[name] = AsyncIrisGlobal(self, "^" + name)
+        return glob
+
+    async def __aenter__(self):
+        """__aenter__() and __aexit__() support "async with AsyncIris(pool) as iris:" syntax."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """__aenter__() and __aexit__() support "async with AsyncIris(pool) as iris:" syntax."""
+        await self.close()
+
+    async def close(self):
+        """Shut down the executor, give back the free connections, and close the pool."""
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+        with self.mutex:
+            free, self.free = list(self.free), deque()
+        for iris, _, _ in free:
+            self.pool.checkin(iris)
+        self.pool.close()
+
+    async def run(self, fn, *args):
+        """Await fn(iris, *args), run on the executor with the pinned connection or one from the pool."""
+        loop = asyncio.get_running_loop()
+        pinned = self.pinned.get()
+        if pinned is not None:
+            return await pinned.run(self.executor, fn, *args)
+        async with self.semaphore:
+            return await loop.run_in_executor(self.executor, self._call_pooled, fn, *args)
+
+    def _call_pooled(self, fn, *args):
+        """fn(iris, *args) on a free connection, given back to the free list after, or to the pool if it failed."""
+        iris = self.checkout()
+        try:
+            result = fn(iris, *args)
+        except Exception:
+            self.pool.checkin(iris)
+            raise
+        with self.pool.cond:
+            opened = self.pool.busy[id(iris)][1]
+        with self.mutex:
+            self.free.append((iris, opened, time.monotonic()))
+        return result
+
+    def checkout(self):
+        """ A connection from the free list, or from the pool when it's empty, run on the executor. The free list and
+            the connections in use never hold more than there are semaphore permits, so the pool can't run out.
+        """
+        with self.mutex:
+            entry = self.free.pop() if self.free else None
+        if entry is None:
+            return self.pool.checkout()
+        iris, opened, last_used = entry
+        now = time.monotonic()
+        if now - opened <= self.pool.max_lifetime and now - last_used <= self.pool.max_idle:
+            return iris
+        self.pool.checkin(iris)
+        return self.pool.checkout()
+
+    def require_pinned(self, operation):
+        if self.pinned.get() is None:
+            raise Exception("{}() needs 'async with iris.connection()' or 'iris.transaction()'".format(operation))
+
+    def connection(self):
+        """Pin one connection for the calls of this task, e.g. to hold locks."""
+        return AsyncIrisConnection(self)
+
+    def transaction(self):
+        """Start a transaction, running all the calls of this task within it on one pinned connection."""
+        return AsyncIrisTransaction(self)
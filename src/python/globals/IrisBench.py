@@ -0,0 +1,248 @@
+"""
+    Benchmark suite for IrisWrapped, runnable with no IRIS server against the IrisLocal stand-in, or against a live
+    IRIS, to compare versions of the wrapper on the same backend.
+    Each benchmark times every call it makes, and reports ops/sec with p50/p99 call latencies as JSON. Setting up
+    the data a benchmark reads isn't timed.
+    Example Usage:
+        python IrisBench.py --backend local -c 100000 -o results.json
+        python IrisBench.py --backend local -c 100000 --compare results.json      # Exits 1 on a regression.
+        python IrisBench.py --backend iris -p 51795 --only get set iter_all
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from collections import OrderedDict
+from IrisWrapped import Iris, IrisConnectionException
+from IrisLocal import IrisLocal
+
+BENCH_GLOBAL = "IrisBench"      # Global killed and filled by the benchmarks.
+
+
+def timed(calls, fn):
+    """Call fn(i) for i in range(calls), returning the latency of each call in seconds."""
+    perf_counter = time.perf_counter
+    latencies = [0.0] * calls
+    for i in range(calls):
+        start = perf_counter()
+        fn(i)
+        latencies[i] = perf_counter() - start
+    return latencies
+
+
+def timed_iter(item_iter):
+    """Exhaust item_iter, returning the latency of each next() in seconds."""
+    perf_counter = time.perf_counter
+    latencies = []
+    while True:
+        start = perf_counter()
+        try:
+            next(item_iter)
+        except StopIteration:
+            return latencies
+        latencies.append(perf_counter() - start)
+
+
+def fill(glob, n, width=1):
+    """^IrisBench(i) = i, or ^IrisBench(i // width, i % width) = i when width > 1."""
+    glob.kill()
+    glob.set_many((i, i) if width == 1 else ((i // width, i % width), i) for i in range(n))
+
+
+def bench_set(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    glob.kill()
+    return n, timed(n, lambda i: glob.__setitem__(i, i))
+
+
+def bench_get(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    fill(glob, n)
+    return n, timed(n, glob.__getitem__)
+
+
+def bench_node_set(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    glob.kill()
+    node = glob.node()
+    return n, timed(n, lambda i: node.set(i, i))
+
+
+def bench_node_get(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    fill(glob, n)
+    return n, timed(n, glob.node().__getitem__)
+
+
+def bench_set_many(iris, n, batch=1000):
+    glob = iris[BENCH_GLOBAL]
+    glob.kill()
+    return n, timed(-(-n // batch), lambda b: glob.set_many((i, i) for i in range(b * batch, min(n, (b + 1) * batch))))
+
+
+def bench_get_many(iris, n, batch=1000):
+    glob = iris[BENCH_GLOBAL]
+    fill(glob, n)
+    return n, timed(-(-n // batch), lambda b: glob.get_many(range(b * batch, min(n, (b + 1) * batch))))
+
+
+def bench_increment(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    glob.kill()
+    return n, timed(n, lambda i: glob.increment(i % 100))
+
+
+def bench_striped_increment(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    glob.kill()
+    counter = glob.striped_counter("hits")
+    return n, timed(n, lambda i: counter.increment())
+
+
+def bench_next_id(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    glob.kill()
+    counter = glob.striped_counter("ids")
+    return n, timed(n, lambda i: counter.next_id())
+
+
+def bench_iteritems(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    fill(glob, n)
+    latencies = timed_iter(iter(glob.iteritems()))
+    return len(latencies), latencies
+
+
+def bench_iter_all(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    fill(glob, n, width=10)
+    latencies = timed_iter(glob.iter_all())
+    return len(latencies), latencies
+
+
+def bench_slicer(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    fill(glob, n, width=10)
+    latencies = timed_iter(glob.slicer(streaming=True)[0:n // 20, 0:5])
+    return len(latencies), latencies
+
+
+def bench_transaction(iris, n):
+    glob = iris[BENCH_GLOBAL]
+    glob.kill()
+
+    def transaction(i):
+        with iris.transaction():
+            glob[i] = i
+    return n, timed(n, transaction)
+
+
+def bench_lock(iris, n):
+    glob = iris[BENCH_GLOBAL]
+
+    def lock_unlock(i):
+        glob.lock(i % 100)
+        glob.unlock(i % 100)
+    return n, timed(n, lock_unlock)
+
+
+def bench_mixed(iris, n, write_ratio=0.2):
+    glob = iris[BENCH_GLOBAL]
+    fill(glob, n)
+    rand = random.Random(42)
+    ops = [(rand.random() < write_ratio, rand.randrange(n)) for _ in range(n)]
+
+    def mixed(i):
+        write, key = ops[i]
+        if write:
+            glob[key] = i
+        else:
+            glob[key]
+    return n, timed(n, mixed)
+
+
+BENCHMARKS = OrderedDict([
+    ("set", bench_set), ("get", bench_get), ("node_set", bench_node_set), ("node_get", bench_node_get),
+    ("set_many", bench_set_many), ("get_many", bench_get_many), ("increment", bench_increment),
+    ("striped_increment", bench_striped_increment), ("next_id", bench_next_id),
+    ("iteritems", bench_iteritems), ("iter_all", bench_iter_all), ("slicer", bench_slicer),
+    ("transaction", bench_transaction), ("lock", bench_lock), ("mixed", bench_mixed)])
+
+
+def summarise(ops, seconds, latencies):
+    latencies = sorted(latencies)
+    return {"ops": ops, "calls": len(latencies), "seconds": seconds,
+            "ops_per_sec": ops / seconds if seconds else 0.0,
+            "p50_us": latencies[len(latencies) // 2] * 1e6 if latencies else 0.0,
+            "p99_us": latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1e6 if latencies else 0.0}
+
+
+def run(iris, n, names=None, backend=""):
+    """Run the named benchmarks, or all of them, with n operations each, returning the results as a dict."""
+    results = OrderedDict()
+    for name in names or BENCHMARKS:
+        ops, latencies = BENCHMARKS[name](iris, n)
+        results[name] = summarise(ops, sum(latencies), latencies)
+    iris[BENCH_GLOBAL].kill()
+    return {"backend": backend, "count": n, "python": platform.python_version(), "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+
+
+def compare(results, baseline, threshold):
+    """Print ops/sec against a baseline run, returning the names of the benchmarks slower by more than threshold."""
+    regressions = []
+    print("{:18s} {:>14s} {:>14s} {:>8s}".format("benchmark", "baseline/sec", "current/sec", "ratio"))
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if not base or not base["ops_per_sec"]:
+            continue
+        ratio = result["ops_per_sec"] / base["ops_per_sec"]
+        if ratio < 1 - threshold:
+            regressions.append(name)
+        print("{:18s} {:14.0f} {:14.0f} {:8.2f}{}".format(name, base["ops_per_sec"], result["ops_per_sec"], ratio,
+                                                          "  <- regression" if name in regressions else ""))
+    return regressions
+
+
+def bench_iris_wrapped():
+    parser = argparse.ArgumentParser(description="Benchmark IrisWrapped.")
+    parser.add_argument("-b", "--backend", help="local stand-in or iris server", choices=("local", "iris"),
+                        default="local")
+    parser.add_argument("-c", "--count", help="Operations per benchmark", type=int, default=100000)
+    parser.add_argument("--only", help="Benchmarks to run", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("-o", "--output", help="JSON results file", type=str, default=None)
+    parser.add_argument("--compare", help="JSON results file to compare with", type=str, default=None)
+    parser.add_argument("--threshold", help="Slow down reported as a regression", type=float, default=0.2)
+    parser.add_argument("-i", "--ip", help="Iris IP Address", type=str, default="127.0.0.1")
+    parser.add_argument("-p", "--port", help="Iris IP Port", type=int, default=51795)
+    parser.add_argument("-n", "--namespace", help="Iris Namespace", type=str, default="USER")
+    parser.add_argument("-u", "--username", help="Iris User Name", type=str, default="_SYSTEM")
+    parser.add_argument("-w", "--password", help="Iris Password", type=str, default="SYS")
+    args = parser.parse_args()
+    try:
+        iris = IrisLocal() if args.backend == "local" else \
+            Iris(ip=args.ip, port=args.port, namespace=args.namespace, username=args.username, password=args.password)
+    except IrisConnectionException as e:
+        print(repr(e))
+        sys.exit(-1)
+    with iris:
+        results = run(iris, args.count, args.only, args.backend)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+    elif not args.output:
+        print(output)
+
+
+# Start event loop.
+if __name__ == '__main__':
+    bench_iris_wrapped()
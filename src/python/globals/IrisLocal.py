@@ -0,0 +1,488 @@
+"""
+    An in-process stand-in for the irisnative backend used by IrisWrapped, so it can be exercised with no IRIS server.
+    Globals are held in a sorted tree per global, following IRIS subscript collation (canonical numbers first, in
+    numeric order, then strings). The IrisWrapped.Server class methods are mirrored in Python by LocalServer.
+    Connections sharing a LocalStore see each other's changes, transactions can be nested and rolled back, and locks
+    follow IRIS rules: incremental, exclusive or shared, conflicting with locks held by other connections on the same
+    node, its ancestors or its descendants, waited for up to their timeout.
+    Example Usage:
+        with IrisLocal() as iris:
+            my_glob = iris.MyGlob
+            my_glob.set_many({(1, 2): 42, (1, 3): 43})
+            print(my_glob.get_many([(1, 2), (1, 3)]))
+"""
+import re
+import json
+import time
+import weakref
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from IrisWrapped import Iris, IrisGlobal, IrisSlicer
+
+
+_NUMERIC_PREFIX = re.compile(r"\s*[-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][-+]?[0-9]+)?")
+_VALID_NUM = re.compile(r"[-+]*(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][-+]?[0-9]+)?")
+
+
+class LocalError(Exception):
+    """Represents an ObjectScript style error raised by the stand-in, e.g. <SUBSCRIPT> or <UNDEFINED>"""
+
+
+def collate(sub):
+    """The collation key of a subscript: (0, number) for canonical numbers, (1, string) for anything else."""
+    if type(sub) is bytes:
+        sub = sub.decode()
+    num = IrisSlicer._canonical(sub)
+    if num is not None:
+        return 0, num
+    sub = str(sub)
+    if sub == "":
+        raise LocalError("<SUBSCRIPT> null subscript")
+    return 1, sub
+
+
+def number(value):
+    """The numeric interpretation of a value, as ObjectScript's unary + would evaluate it."""
+    if type(value) in (int, float):
+        return value
+    if type(value) is bool:
+        return int(value)
+    if type(value) is bytes:
+        value = value.decode(errors="replace")
+    match = _NUMERIC_PREFIX.match(str(value) if value is not None else "")
+    if match is None:
+        return 0
+    value = float(match.group())
+    return int(value) if value.is_integer() else value
+
+
+class LocalNode(object):
+    """A node of a global: an optional value plus children kept in collation order."""
+    __slots__ = ("value", "keys", "children")
+    UNDEFINED = object()
+
+    def __init__(self):
+        self.value = LocalNode.UNDEFINED
+        self.keys = []          # Sorted collation keys of the children.
+        self.children = {}      # collation key -> LocalNode
+
+    def data(self):
+        """The $Data() value of this node."""
+        return (10 if self.keys else 0) + (0 if self.value is LocalNode.UNDEFINED else 1)
+
+    def order(self, coll, reverse=False):
+        """The collation key of the child following coll ($Order), None when there is no more."""
+        keys = self.keys
+        if reverse:
+            idx = len(keys) if coll is None else bisect_left(keys, coll)
+            return keys[idx - 1] if idx > 0 else None
+        idx = 0 if coll is None else bisect_right(keys, coll)
+        return keys[idx] if idx < len(keys) else None
+
+
+class LocalStore(object):
+    """The set of globals of a stand-in namespace, shared by every LocalIris connected to it."""
+    def __init__(self):
+        self.globals = {}
+        self.mutex = threading.RLock()                  # Held by each operation of the LocalIris connected to it.
+        self.lock_released = threading.Condition(self.mutex)
+        self.lock_table = {}    # (global_name, collation keys) -> {LocalIris: [exclusive count, shared count]}
+
+    def lock_conflict(self, ref, owner, shared):
+        """Is ref, an ancestor or a descendant locked by another connection than owner, in a conflicting mode."""
+        global_name, colls = ref
+        for (other_name, other_colls), holders in self.lock_table.items():
+            if other_name != global_name or colls[:len(other_colls)] != other_colls[:len(colls)]:
+                continue
+            for holder, (exclusive, shared_count) in holders.items():
+                if holder is not owner and (exclusive or (shared_count and not shared)):
+                    return True
+        return False
+
+    def find(self, global_name, subs):
+        """The node at global_name(subs), or None if it does not exist."""
+        node = self.globals.get(global_name)
+        for sub in subs:
+            if node is None:
+                return None
+            node = node.children.get(collate(sub))
+        return node
+
+    def create(self, global_name, subs):
+        """The node at global_name(subs), created with its parents if it does not exist."""
+        node = self.globals.get(global_name)
+        if node is None:
+            node = self.globals[global_name] = LocalNode()
+        for sub in subs:
+            coll = collate(sub)
+            child = node.children.get(coll)
+            if child is None:
+                child = node.children[coll] = LocalNode()
+                insort(node.keys, coll)
+            node = child
+        return node
+
+    def kill(self, global_name, subs):
+        """Remove global_name(subs) with all its descendants, pruning parents left empty."""
+        node = self.globals.get(global_name)
+        path = []
+        for sub in subs:
+            if node is None:
+                return
+            coll = collate(sub)
+            path.append((node, coll))
+            node = node.children.get(coll)
+        if node is None:
+            return
+        if not path:
+            del self.globals[global_name]
+            return
+        for parent, coll in reversed(path):
+            del parent.children[coll]
+            del parent.keys[bisect_left(parent.keys, coll)]
+            if parent.keys or parent.value is not LocalNode.UNDEFINED:
+                return
+        del self.globals[global_name]
+
+    def snapshot(self, global_name, subs, subtree):
+        """Copy of the value of global_name(subs) and, if subtree, of all its descendants, for restore()."""
+        node = self.find(global_name, subs)
+        if node is None:
+            return None
+        if not subtree:
+            return node.value
+        return LocalStore._copy(node)
+
+    def restore(self, global_name, subs, snapshot, subtree):
+        """Put global_name(subs) back the way it was when snapshot() was taken."""
+        if subtree:
+            self.kill(global_name, subs)
+            if snapshot is not None:
+                node = self.create(global_name, subs)
+                node.value, node.keys, node.children = snapshot.value, snapshot.keys, snapshot.children
+        elif snapshot is None or snapshot is LocalNode.UNDEFINED:
+            node = self.find(global_name, subs)
+            if node is not None:
+                node.value = LocalNode.UNDEFINED
+                if not node.keys:
+                    self.kill(global_name, subs)
+        else:
+            self.create(global_name, subs).value = snapshot
+
+    @staticmethod
+    def _copy(node):
+        copy = LocalNode()
+        copy.value = node.value
+        copy.keys = list(node.keys)
+        copy.children = {coll: LocalStore._copy(child) for coll, child in node.children.items()}
+        return copy
+
+
+class LocalIterator(object):
+    """Mirrors irisnative's IRISIterator: $Order through the children of one node, as subscripts, values or items."""
+    def __init__(self, store, global_name, subs):
+        self.store = store
+        self.global_name = global_name
+        self.subs = subs
+        self.coll = None
+        self.reverse = False
+        self.mode = "subscripts"
+
+    def subscripts(self):
+        self.mode = "subscripts"
+        return self
+
+    def values(self):
+        self.mode = "values"
+        return self
+
+    def items(self):
+        self.mode = "items"
+        return self
+
+    def reversed(self):
+        self.reverse = not self.reverse
+        return self
+
+    def startFrom(self, sub):
+        self.coll = None if sub is None else collate(sub)
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self.store.mutex:
+            node = self.store.find(self.global_name, self.subs)
+            coll = None if node is None else node.order(self.coll, self.reverse)
+            if coll is None:
+                raise StopIteration
+            self.coll = coll
+            child = node.children[coll]
+            value = None if child.value is LocalNode.UNDEFINED else child.value
+        return coll[1] if self.mode == "subscripts" else value if self.mode == "values" else (coll[1], value)
+
+    next = __next__
+
+
+class LocalServer(object):
+    """Pure-Python mirror of the IrisWrapped.Server ObjectScript class, run against a LocalIris."""
+    def __init__(self, iris):
+        self.iris = iris
+
+    def Batch(self, global_name, ops, max_length=0):
+        results = []
+        length = 0
+        for op in json.loads(ops):
+            code, subs = op[0], op[1]
+            if code == "G":
+                value = self.iris.get(global_name, *subs)
+                if isinstance(value, bytes):
+                    value = value.decode("latin-1")     # The server only sees strings.
+                if value is not None:
+                    length += len(str(value))
+                    if max_length and length > max_length:
+                        break
+                results.append(value)
+            elif code == "S":
+                self.iris.set(op[2], global_name, *subs)
+                results.append(None)
+            elif code == "K":
+                self.iris.kill(global_name, *subs)
+                results.append(None)
+            else:
+                raise LocalError("Unknown batch operation: " + repr(code))
+        return json.dumps(results)
+
+    def GetRange(self, global_name, subscripts, start, stop):
+        subscripts = json.loads(subscripts)
+        subs, values = [], []
+        for sub, value in self.iris.iterator(global_name, *subscripts).items().startFrom(start - 1):
+            if type(sub) is str or sub >= stop:
+                break
+            if sub == int(sub) and self.iris.isDefined(global_name, *subscripts, sub) % 10:
+                subs.append(int(sub))
+                values.append(value)
+        return json.dumps([subs, values])
+
+    def SetRange(self, global_name, subscripts, start, values):
+        subscripts = json.loads(subscripts)
+        count = 0
+        for idx, value in enumerate(json.loads(values)):
+            if value is not None:
+                self.iris.set(value, global_name, *subscripts, start + idx)
+                count += 1
+        return count
+
+    def Aggregate(self, global_name, subscripts, op, depth=1):
+        subscripts = json.loads(subscripts)
+        if op in ("first", "last"):
+            sub_iter = self.iris.iterator(global_name, *subscripts).subscripts()
+            return json.dumps([next(sub_iter.reversed() if op == "last" else sub_iter, None)])
+        if op not in ("count", "sum", "min", "max"):
+            raise LocalError("Unknown aggregate: " + repr(op))
+        acc = 0 if op in ("count", "sum") else None
+
+        def walk(subs, depth):
+            nonlocal acc
+            for sub in self.iris.iterator(global_name, *subs).subscripts():
+                node = (*subs, sub)
+                data = self.iris.isDefined(global_name, *node)
+                if depth <= 1:
+                    if op == "count":
+                        acc += 1
+                    elif data % 10:
+                        value = self.iris.get(global_name, *node)
+                        if type(value) in (int, float) or _VALID_NUM.fullmatch(str(value)):
+                            value = number(value)
+                            if op == "sum":
+                                acc += value
+                            elif acc is None or (op == "min" and value < acc) or (op == "max" and value > acc):
+                                acc = value
+                if depth != 1 and data >= 10:
+                    walk(node, depth - 1)
+
+        walk(subscripts, depth)
+        return json.dumps([acc])
+
+    def LockMany(self, locks, mode, timeout):
+        locks = json.loads(locks)
+        deadline = time.monotonic() + timeout
+        for idx, (global_name, subs) in enumerate(locks):
+            if not self.iris.lock(mode, max(0, deadline - time.monotonic()), global_name, *subs):
+                self.UnlockMany(json.dumps(locks[:idx]), mode + "I")
+                return idx + 1
+        return 0
+
+    def UnlockMany(self, locks, mode):
+        locks = json.loads(locks)
+        for global_name, subs in locks:
+            self.iris.unlock(mode, global_name, *subs)
+        return len(locks)
+
+
+class LocalConnection(object):
+    """Mirrors the irisnative connection object. Closing it rolls back and releases the locks, as IRIS would."""
+    def __init__(self):
+        self.closed = False
+        self.iris = None
+
+    def isClosed(self):
+        return self.closed
+
+    def isUsingSharedMemory(self):
+        return False
+
+    def close(self):
+        if not self.closed and self.iris is not None:
+            self.iris.tRollback()
+            self.iris.releaseAllLocks()
+        self.closed = True
+
+
+class LocalIris(object):
+    """Mirrors the irisnative IRIS object over a LocalStore."""
+    def __init__(self, store, connection):
+        self.store = store
+        self.connection = connection
+        connection.iris = self
+        self.server = LocalServer(self)
+        self.tlevels = []       # Undo journal of each open transaction level: (global_name, subs, snapshot, subtree)
+        self.deferred = []      # Unlocks deferred to the end of the transaction: (ref, shared)
+
+    def get(self, global_name, *subs):
+        with self.store.mutex:
+            node = self.store.find(global_name, subs)
+            return None if node is None or node.value is LocalNode.UNDEFINED else node.value
+
+    def _journal(self, global_name, subs, subtree=False):
+        if self.tlevels:
+            self.tlevels[-1].append((global_name, subs, self.store.snapshot(global_name, subs, subtree), subtree))
+
+    def set(self, value, global_name, *subs):
+        with self.store.mutex:
+            self._journal(global_name, subs)
+            self.store.create(global_name, subs).value = value
+
+    def kill(self, global_name, *subs):
+        with self.store.mutex:
+            self._journal(global_name, subs, subtree=True)
+            self.store.kill(global_name, subs)
+
+    def isDefined(self, global_name, *subs):
+        with self.store.mutex:
+            node = self.store.find(global_name, subs)
+            return 0 if node is None else node.data()
+
+    def increment(self, value, global_name, *subs):
+        with self.store.mutex:
+            self._journal(global_name, subs)
+            node = self.store.create(global_name, subs)
+            current = 0 if node.value is LocalNode.UNDEFINED else number(node.value)
+            node.value = current + number(value)
+            return node.value
+
+    def iterator(self, global_name, *subs):
+        return LocalIterator(self.store, global_name, subs)
+
+    def lock(self, lock_mode, timeout, global_name, *subs):
+        """Incremental lock, "S"hared or exclusive ("E"scalating is taken as plain), False if timeout expires first."""
+        ref = (global_name, tuple(collate(sub) for sub in subs))
+        shared = "S" in lock_mode
+        deadline = None if timeout is None or timeout < 0 else time.monotonic() + timeout
+        with self.store.lock_released:
+            while self.store.lock_conflict(ref, self, shared):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.store.lock_released.wait(remaining)
+            self.store.lock_table.setdefault(ref, {}).setdefault(self, [0, 0])[1 if shared else 0] += 1
+            return True
+
+    def _release(self, ref, shared):
+        holders = self.store.lock_table.get(ref)
+        counts = None if holders is None else holders.get(self)
+        if counts is None or not counts[1 if shared else 0]:
+            return
+        counts[1 if shared else 0] -= 1
+        if not any(counts):
+            del holders[self]
+            if not holders:
+                del self.store.lock_table[ref]
+        self.store.lock_released.notify_all()
+
+    def unlock(self, lock_mode, global_name, *subs):
+        """Decrement a lock, at once or, "D"eferred, at the end of the transaction."""
+        ref = (global_name, tuple(collate(sub) for sub in subs))
+        with self.store.lock_released:
+            if "D" in lock_mode and self.tlevels:
+                self.deferred.append((ref, "S" in lock_mode))
+            else:
+                self._release(ref, "S" in lock_mode)
+
+    def releaseAllLocks(self):
+        with self.store.lock_released:
+            for ref in [ref for ref, holders in self.store.lock_table.items() if self in holders]:
+                del self.store.lock_table[ref][self]
+                if not self.store.lock_table[ref]:
+                    del self.store.lock_table[ref]
+            self.deferred = []
+            self.store.lock_released.notify_all()
+
+    def _release_deferred(self):
+        deferred, self.deferred = self.deferred, []
+        for ref, shared in deferred:
+            self._release(ref, shared)
+
+    def tStart(self):
+        with self.store.mutex:
+            self.tlevels.append([])
+
+    def tCommit(self):
+        with self.store.mutex:
+            journal = self.tlevels.pop()
+            if self.tlevels:
+                self.tlevels[-1].extend(journal)    # Still undone if an outer level rolls back.
+            else:
+                self._release_deferred()
+
+    def tRollbackOne(self):
+        with self.store.mutex:
+            for global_name, subs, snapshot, subtree in reversed(self.tlevels.pop()):
+                self.store.restore(global_name, subs, snapshot, subtree)
+            if not self.tlevels:
+                self._release_deferred()
+
+    def tRollback(self):
+        with self.store.mutex:
+            while self.tlevels:
+                self.tRollbackOne()
+
+    def getTLevel(self):
+        return len(self.tlevels)
+
+    def classMethodValue(self, class_name, method_name, *args):
+        if class_name != IrisGlobal.SERVER_CLASS:
+            raise LocalError("<CLASS DOES NOT EXIST> " + class_name)
+        with self.store.mutex:
+            return getattr(self.server, method_name)(*args)
+
+
+class IrisLocal(Iris):
+    """
+        IrisLocal is an Iris connected to an in-process LocalStore instead of an IRIS server.
+            usage:  store = LocalStore()                # Share one store to get several connections to the same data.
+                    with IrisLocal(store) as iris:
+                        iris.MyGlob[1, 2, 3] = 42
+    """
+    def __init__(self, store=None):
+        # Initially, no transaction is started.
+        self.trans = deque()
+        self.caches = weakref.WeakSet()
+        self.handles = weakref.WeakSet()
+        self.lock_stats = Iris.new_lock_stats()
+        store = LocalStore() if store is None else store
+        self.conn_args = dict(store=store)
+        self.iris_connection = LocalConnection()
+        self.iris = LocalIris(store, self.iris_connection)
@@ -0,0 +1,315 @@
+"""
+    Binary snapshots of global subtrees, for backups, test fixtures and offline read replicas.
+    A snapshot file holds the nodes with a value of a subtree, sorted in IRIS collation order, as length prefixed
+    records followed by a sparse index. GlobalSnapshot memory maps it read only, so a seek reads a few pages of the
+    file rather than loading it.
+    Example Usage:
+        with Iris(ip=..., port=... etc) as iris:
+            iris.MyGlob.dump((1,), "myglob.snap")               # Stream ^MyGlob(1,...) to the file.
+            iris.MyCopy.load("myglob.snap")                     # Restore it into ^MyCopy(1,...) with batched sets.
+        with GlobalSnapshot("myglob.snap") as snap:
+            snap[1, 2, 3]                                       # ^MyGlob(1,2,3) as it was dumped
+            snap.order((1, 2))                                  # $Order(^MyGlob(1,2))
+            for k, v in snap.iter_all((1, 2)):                  # All the nodes at and below (1,2)
+                print(k, v)
+    File layout, little endian:
+        header  MAGIC, u32 length, JSON {"global", "key", "time", "index_every"}
+        record  u32 length, u8 subscript count, subscripts, value       each an item: u8 tag, payload
+        index   u64 offset of every INDEX_EVERY'th record
+        footer  u64 index offset, u64 index entries, u64 records, MAGIC_END
+"""
+import os
+import mmap
+import json
+import time
+import struct
+from IrisWrapped import IrisSlicer, IrisGlobal
+
+MAGIC = b"IRISSNP1"
+MAGIC_END = b"IRISEND1"
+INDEX_EVERY = 128               # Records per sparse index entry, the most a seek scans.
+HIGH = (2,)                     # Collates after every subscript.
+MISSING = object()
+
+U32 = struct.Struct("<I")
+I64 = struct.Struct("<q")
+F64 = struct.Struct("<d")
+FOOTER = struct.Struct("<QQQ")
+
+
+def collate(key):
+    """Sort key of a subscript tuple in IRIS collation: numbers first, in numeric order, then strings."""
+    return IrisSlicer._collation(key)
+
+
+def encode(item, out):
+    """Append the tagged encoding of a subscript or value to the bytearray out."""
+    kind = type(item)
+    if item is None:
+        out += b"N"
+    elif kind is int and -2 ** 63 <= item < 2 ** 63:
+        out += b"I" + I64.pack(item)
+    elif kind is float:
+        out += b"D" + F64.pack(item)
+    elif kind in (str, int):            # Big integers are kept as their decimal string.
+        data = str(item).encode("utf-8")
+        out += (b"S" if kind is str else b"L") + U32.pack(len(data)) + data
+    elif kind is bytes:
+        out += b"B" + U32.pack(len(item)) + item
+    else:
+        raise TypeError("Can't snapshot a {}: {!r}".format(kind.__name__, item))
+
+
+def decode(buf, pos):
+    """The item encoded at buf[pos], and the position after it."""
+    tag = buf[pos]
+    pos += 1
+    if tag == 0x4E:     # N
+        return None, pos
+    if tag == 0x49:     # I
+        return I64.unpack_from(buf, pos)[0], pos + 8
+    if tag == 0x44:     # D
+        return F64.unpack_from(buf, pos)[0], pos + 8
+    size = U32.unpack_from(buf, pos)[0]
+    data = buf[pos + 4:pos + 4 + size]
+    pos += 4 + size
+    if tag == 0x53:     # S
+        return data.decode("utf-8"), pos
+    if tag == 0x4C:     # L
+        return int(data), pos
+    if tag == 0x42:     # B
+        return bytes(data), pos
+    raise Exception("Corrupt snapshot: unknown item tag {!r}".format(chr(tag)))
+
+
+class SnapshotWriter(object):
+    """
+    Writes nodes, in collation order, to a snapshot file. The file only appears at 'path' once it's complete.
+        usage:  with SnapshotWriter("myglob.snap", "^MyGlob", (1,)) as writer:
+                    writer.write((1, 2, 3), 42)
+    """
+    def __init__(self, path, global_name, key=()):
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.file = open(self.temp_path, "wb", buffering=1 << 20)
+        meta = json.dumps({"global": global_name, "key": list(key), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                           "index_every": INDEX_EVERY}).encode("utf-8")
+        self.file.write(MAGIC + U32.pack(len(meta)) + meta)
+        self.offset = len(MAGIC) + 4 + len(meta)
+        self.index = []
+        self.count = 0
+        self.last = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, ex_traceback):
+        if ex_type is None:
+            self.close()
+        else:
+            self.file.close()
+            os.remove(self.temp_path)
+
+    def write(self, key, value):
+        coll = collate(key)
+        if self.last is not None and coll <= self.last:
+            raise Exception("Snapshot nodes out of order: {!r}".format(key))
+        self.last = coll
+        body = bytearray((len(key),))
+        for sub in key:
+            encode(sub, body)
+        encode(value, body)
+        if self.count % INDEX_EVERY == 0:
+            self.index.append(self.offset)
+        self.file.write(U32.pack(len(body)))
+        self.file.write(body)
+        self.offset += 4 + len(body)
+        self.count += 1
+
+    def close(self):
+        """Write the index and footer, and move the file into place."""
+        self.file.write(struct.pack("<{}Q".format(len(self.index)), *self.index))
+        self.file.write(FOOTER.pack(self.offset, len(self.index), self.count) + MAGIC_END)
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+
+class GlobalSnapshot(object):
+    """
+    GlobalSnapshot reads a snapshot file, memory mapped, with the same subscripts as the dumped global.
+        usage:  snap = GlobalSnapshot("myglob.snap")
+                snap.global_name, snap.key                  # -> "^MyGlob", (1,) as dumped
+                len(snap)                                   # Number of nodes with a value
+                x = snap[1,2,3]                             # ^MyGlob(1,2,3), KeyError when it has no value
+                x = snap.get((1,2,3), default)
+                snap.data((1,2))                            # $Data(^MyGlob(1,2))
+                snap.order((1,2))                           # $Order(^MyGlob(1,2)), None at the end
+                snap.order((1,""), reverse=True)            # $Order(^MyGlob(1,""),-1), the last subscript below (1,)
+                for k in snap.iterkeys((1,))                # $Order iterate subscripts below (1,)
+                for k,v in snap.iteritems((1,))             # $Order iterate (subscript,value), None when no value
+                for k,v in snap.iter_all((1,))              # Nodes with a value at and below (1,)
+                for k,v in snap.seek((1,2))                 # Nodes with a value from (1,2) to the end
+    """
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise Exception("Not a snapshot file: {}".format(path))
+        buf = self.map
+        if buf[:len(MAGIC)] != MAGIC or buf[-len(MAGIC_END):] != MAGIC_END:
+            self.close()
+            raise Exception("Not a snapshot file: {}".format(path))
+        size = U32.unpack_from(buf, len(MAGIC))[0]
+        meta = json.loads(bytes(buf[len(MAGIC) + 4:len(MAGIC) + 4 + size]).decode("utf-8"))
+        self.global_name = meta["global"]
+        self.key = tuple(meta["key"])
+        self.time = meta["time"]
+        self.end, entries, self.count = FOOTER.unpack_from(buf, len(buf) - len(MAGIC_END) - FOOTER.size)
+        self.index = struct.unpack_from("<{}Q".format(entries), buf, self.end)
+        self.index_colls = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, ex_traceback):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, offset):
+        """(key, value, offset of the next record) of the record at offset."""
+        buf = self.map
+        size = U32.unpack_from(buf, offset)[0]
+        pos = offset + 5
+        key = []
+        for _ in range(buf[offset + 4]):
+            sub, pos = decode(buf, pos)
+            key.append(sub)
+        value, _ = decode(buf, pos)
+        return tuple(key), value, offset + 4 + size
+
+    def _index_coll(self, idx):
+        coll = self.index_colls.get(idx)
+        if coll is None:
+            coll = self.index_colls[idx] = collate(self._record(self.index[idx])[0])
+        return coll
+
+    def _block(self, coll):
+        """Index of the last sparse index entry collating before coll, -1 if there are none."""
+        low, high = 0, len(self.index)
+        while low < high:
+            mid = (low + high) // 2
+            if self._index_coll(mid) < coll:
+                low = mid + 1
+            else:
+                high = mid
+        return low - 1
+
+    def _scan(self, offset):
+        while offset < self.end:
+            key, value, offset = self._record(offset)
+            yield key, value
+
+    def _seek(self, coll):
+        """(key, value) from the first record collating at or after coll."""
+        block = self._block(coll)
+        records = self._scan(self.index[block] if block >= 0 else self.index[0] if self.index else self.end)
+        for key, value in records:
+            if collate(key) >= coll:
+                yield key, value
+                yield from records
+                return
+
+    def _last_before(self, coll):
+        """The key of the last record collating before coll, None if there are none."""
+        block = self._block(coll)
+        if block < 0:
+            return None
+        last = None
+        stop = self.index[block + 1] if block + 1 < len(self.index) else self.end
+        offset = self.index[block]
+        while offset < stop:
+            key, _, offset = self._record(offset)
+            if collate(key) >= coll:
+                break
+            last = key
+        return last
+
+    def seek(self, key=None):
+        """Iterate (key, value) of the nodes with a value, from key to the end of the snapshot."""
+        return self._seek(collate(IrisGlobal._key_tuple(key)))
+
+    def iter_all(self, key=None):
+        """Depth first iterate (key, value) of the nodes with a value, at and below key."""
+        key = IrisGlobal._key_tuple(key)
+        coll = collate(key)
+        for k, v in self._seek(coll):
+            if collate(k[:len(key)]) != coll:
+                return
+            yield k, v
+
+    def get(self, key=None, default=None):
+        key = IrisGlobal._key_tuple(key)
+        for k, v in self._seek(collate(key)):
+            return v if collate(k) == collate(key) else default
+        return default
+
+    def __getitem__(self, key=None):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def data(self, key=None):
+        """$Data of key: 1 has a value, 10 has children, 11 both, 0 neither."""
+        key = IrisGlobal._key_tuple(key)
+        coll = collate(key)
+        result = 0
+        for k, _ in self._seek(coll):
+            if collate(k[:len(key)]) != coll:
+                break
+            if len(k) == len(key):
+                result = 1
+            else:
+                return result + 10
+        return result
+
+    def order(self, key, reverse=False):
+        """ $Order: the subscript after (or before, in reverse) the last subscript of key, at its level.
+            A last subscript of "" starts from the first (or last) one. Returns None past the end.
+        """
+        key = IrisGlobal._key_tuple(key)
+        prefix = collate(key[:-1])
+        if reverse:
+            k = self._last_before(prefix + (HIGH,) if key[-1] == "" else collate(key))
+        else:
+            k = None
+            for k, _ in self._seek(prefix if key[-1] == "" else collate(key) + (HIGH,)):
+                if len(k) > len(prefix) or collate(k[:len(prefix)]) != prefix:     # Skips the parent node itself.
+                    break
+        if k is None or len(k) <= len(prefix) or collate(k[:len(prefix)]) != prefix:
+            return None
+        return k[len(prefix)]
+
+    def iterkeys(self, key=None, reverse=False):
+        """$Order iterate the subscripts below key."""
+        key = IrisGlobal._key_tuple(key)
+        sub = self.order(key + ("",), reverse)
+        while sub is not None:
+            yield sub
+            sub = self.order(key + (sub,), reverse)
+
+    def iteritems(self, key=None, reverse=False):
+        """$Order iterate (subscript, value) below key, value being None for nodes without one."""
+        key = IrisGlobal._key_tuple(key)
+        for sub in self.iterkeys(key, reverse):
+            yield sub, self.get(key + (sub,))
@@ -0,0 +1,233 @@
+"""
+    Optional instrumentation of the native calls made by IrisWrapped: counts and latency histograms per operation
+    type and per global. When it's not enabled the native object is used directly, so there's no overhead at all.
+    Example Usage:
+        with Iris(ip=..., port=... etc) as iris:
+            stats = IrisStats.enable(iris)                  # Time every native call of this connection.
+            for k, v in iris.MyGlob.iter_all():
+                pass
+            print(stats.snapshot()["ops"]["iterator"])      # {"count": ..., "mean": ..., "p99": ..., ...}
+            stats.start_dump(60, path="iris_stats.json")    # Dump a snapshot every minute.
+            IrisStats.disable(iris)
+    The connections of an IrisPool can share one IrisStats:
+        pool = IrisPool(2, 10, factory=stats.wrap_factory(lambda: Iris(ip=..., port=...)))
+        stats.enable_pool(pool)                             # Or for a pool already in use.
+"""
+import json
+import time
+import threading
+
+
+class IrisStats(object):
+    """Counts and times native calls by (global, operation), in log2 buckets of microseconds."""
+    BUCKETS = 32    # Bucket i counts latencies below 2**i microseconds, and at least 2**(i-1).
+
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self.calls = {}         # (global_name, op) -> [count, total, min, max, buckets]
+        self.started = time.time()
+        self.dumper = None
+        self.dump_stop = None
+
+    @staticmethod
+    def _swap(iris, old, new):
+        """Use the native object 'new' instead of 'old' in the Iris connection 'iris' and its existing handles."""
+        iris.iris = new
+        for handle in list(iris.handles):      # IrisGlobal's, cached ones included, and IrisNode's made before.
+            if handle.iris is old:
+                handle.bind(new)
+
+    @staticmethod
+    def enable(iris, stats=None):
+        """ Instrument the native calls of the Iris connection 'iris', into 'stats' or a new IrisStats. The globals,
+            cached globals and nodes already made from it are instrumented too. Native iterators already made are not.
+        """
+        stats = stats if stats is not None else IrisStats()
+        IrisStats.disable(iris)
+        IrisStats._swap(iris, iris.iris, InstrumentedIris(iris.iris, stats))
+        return stats
+
+    @staticmethod
+    def disable(iris):
+        """Stop instrumenting the native calls of the Iris connection 'iris'."""
+        proxy = iris.iris
+        if isinstance(proxy, InstrumentedIris):
+            IrisStats._swap(iris, proxy, proxy.native)
+
+    def wrap_factory(self, factory):
+        """Wrap a connection factory, e.g. IrisPool's, so the connections it makes are instrumented into self."""
+        def instrumented():
+            iris = factory()
+            IrisStats.enable(iris, self)
+            return iris
+        return instrumented
+
+    def enable_pool(self, pool):
+        """Instrument into self the connections an IrisPool already has, idle or checked out, and those it opens."""
+        pool.factory = self.wrap_factory(pool.factory)
+        for iris in pool.connections():
+            IrisStats.enable(iris, self)
+
+    def record(self, global_name, op, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), IrisStats.BUCKETS - 1)
+        with self.mutex:
+            entry = self.calls.get((global_name, op))
+            if entry is None:
+                entry = self.calls[(global_name, op)] = [0, 0.0, seconds, seconds, [0] * IrisStats.BUCKETS]
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds < entry[2]:
+                entry[2] = seconds
+            if seconds > entry[3]:
+                entry[3] = seconds
+            entry[4][bucket] += 1
+
+    def reset(self):
+        with self.mutex:
+            self.calls = {}
+            self.started = time.time()
+
+    @staticmethod
+    def _merge(entries):
+        count = sum(entry[0] for entry in entries)
+        buckets = [sum(bucket) for bucket in zip(*(entry[4] for entry in entries))]
+        return [count, sum(entry[1] for entry in entries), min(entry[2] for entry in entries),
+                max(entry[3] for entry in entries), buckets]
+
+    @staticmethod
+    def _summary(entry):
+        """Count, total and latencies in seconds, percentiles being the upper bound of their histogram bucket."""
+        count, total, least, most, buckets = entry
+
+        def percentile(q):
+            seen = 0
+            for idx, n in enumerate(buckets):
+                seen += n
+                if seen >= q * count:
+                    return min(2 ** idx / 1e6, most)
+            return most
+
+        return {"count": count, "total": total, "mean": total / count, "min": least, "max": most,
+                "p50": percentile(0.5), "p90": percentile(0.9), "p99": percentile(0.99),
+                "histogram_us": {2 ** idx: n for idx, n in enumerate(buckets) if n}}
+
+    def snapshot(self):
+        """The statistics so far, by operation and by global then operation."""
+        with self.mutex:
+            calls = {key: [entry[0], entry[1], entry[2], entry[3], list(entry[4])] for key, entry in self.calls.items()}
+        by_op, by_global = {}, {}
+        for (global_name, op), entry in calls.items():
+            by_op.setdefault(op, []).append(entry)
+            by_global.setdefault(global_name or "", {})[op] = IrisStats._summary(entry)
+        return {"started": self.started, "time": time.time(),
+                "ops": {op: IrisStats._summary(IrisStats._merge(entries)) for op, entries in by_op.items()},
+                "globals": by_global}
+
+    def dump(self, path=None, iris_global=None):
+        """Write a JSON snapshot to the file 'path', and/or to iris_global[ISO timestamp]."""
+        snapshot = json.dumps(self.snapshot())
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(snapshot)
+        if iris_global is not None:
+            iris_global[time.strftime("%Y-%m-%dT%H:%M:%S")] = snapshot
+
+    def start_dump(self, interval, path=None, iris_global=None):
+        """ dump() every 'interval' seconds from a background thread.
+            An iris_global should use a connection of its own, e.g. from iris.clone(), as it's written from that thread.
+        """
+        self.stop_dump()
+        self.dump_stop = stop = threading.Event()
+
+        def dumper():
+            while not stop.wait(interval):
+                self.dump(path, iris_global)
+
+        self.dumper = threading.Thread(target=dumper, daemon=True)
+        self.dumper.start()
+
+    def stop_dump(self):
+        if self.dumper is not None:
+            self.dump_stop.set()
+            self.dumper.join()
+            self.dumper = None
+
+
+class InstrumentedIterator(object):
+    """Proxy to an irisnative iterator, timing each $Order round trip as an "iterator" operation."""
+    def __init__(self, native, stats, global_name):
+        self.native = native
+        self.stats = stats
+        self.global_name = global_name
+
+    def subscripts(self):
+        self.native = self.native.subscripts()
+        return self
+
+    def values(self):
+        self.native = self.native.values()
+        return self
+
+    def items(self):
+        self.native = self.native.items()
+        return self
+
+    def reversed(self):
+        self.native = self.native.reversed()
+        return self
+
+    def startFrom(self, sub):
+        self.native = self.native.startFrom(sub)
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self.native)
+        finally:
+            self.stats.record(self.global_name, "iterator", time.perf_counter() - start)
+
+    next = __next__
+
+
+class InstrumentedIris(object):
+    """Proxy to an irisnative IRIS object, timing the calls made through it into an IrisStats."""
+    # Position of the global name in the arguments of the timed native methods, None when there's no global.
+    GLOBAL_ARG = {"get": 0, "set": 1, "kill": 0, "isDefined": 0, "increment": 1, "iterator": 0,
+                  "lock": 2, "unlock": 1, "releaseAllLocks": None,
+                  "tStart": None, "tCommit": None, "tRollback": None, "tRollbackOne": None,
+                  "classMethodValue": 2}
+
+    def __init__(self, native, stats):
+        self.native = native
+        self.stats = stats
+
+    def __getattr__(self, name):
+        """Wrap the native method on first use, and keep the wrapper as an attribute for the next lookups."""
+        attr = getattr(self.native, name)
+        if name not in InstrumentedIris.GLOBAL_ARG:
+            return attr
+        idx = InstrumentedIris.GLOBAL_ARG[name]
+        stats = self.stats
+        perf_counter = time.perf_counter
+
+        def timed(*args):
+            global_name = args[idx] if idx is not None and len(args) > idx else None
+            op = name
+            if name == "classMethodValue":      # Time server side methods by name, with their global if any.
+                op = args[1]
+                if type(global_name) is not str or not global_name.startswith("^"):
+                    global_name = None
+            start = perf_counter()
+            try:
+                result = attr(*args)
+            finally:
+                if name != "iterator":
+                    stats.record(global_name, op, perf_counter() - start)
+            return InstrumentedIterator(result, stats, global_name) if name == "iterator" else result
+
+        setattr(self, name, timed)
+        return timed
@@ -7,11 +7,27 @@
             with con.transaction() as tran:
                 my_glob[1,2,3] = 42
 """
+import os
+import re
 import sys
+import math
+import json
 import time
+import queue
+import weakref
+import itertools
 import argparse
-from collections import deque
-import irisnative
+import threading
+from functools import partial
+from contextlib import contextmanager
+from collections import deque, OrderedDict
+try:
+    import irisnative
+except ImportError:     # Only the IrisLocal stand-in backend can be used without the native driver.
+    irisnative = None
+
+_CANONICAL_INT = re.compile(r"-?[1-9][0-9]*|0")
+_CANONICAL_DEC = re.compile(r"-?[0-9]*\.[0-9]*[1-9]")
 
 
 class IrisSlicer(object):
@@ -22,44 +38,122 @@ class IrisSlicer(object):
     IrisSlicer is constructed from an IrisGlobal.slicer() call.
     usage:  my_slicer = IrisGlobal(IrisConnection(), ""MyGlob").slicer()
             dict = my_slicer[start:end:step, start:end:step ...]
+            my_slicer = IrisGlobal(IrisConnection(), ""MyGlob").slicer(streaming=True)
+            for key, value in my_slicer[start:end, start:end ...]:     # Lazily fetched, nothing held in memory.
+                ...
+            my_slicer.round_trips                                       # Round trips taken by the last slice.
     """
-    def __init__(self, iris_global):
+    def __init__(self, iris_global, streaming=False):
         self.iris_global = iris_global
+        self.streaming = streaming
+        self.round_trips = 0
 
     def __getitem__(self, keys=None):
         """Support for "value = my_global[slice, slice, ...]" syntax."""
+        items = self.iter_slice(keys)
+        return items if self.streaming else {key: value for key, value in items}
+
+    def iter_slice(self, keys=None):
+        """ Lazily yield (key, value) for my_global[slice, slice, ...].
+            The node status ($Data) is only asked for when there are more slices to go deeper into.
+        """
         if type(keys) is not tuple:     # Single value/slice becomes tuple(x, )
-            keys = tuple(keys,)
-        iris_global = self.iris_global
+            keys = (keys,)
+        self.round_trips = 0
+        yield from self._iter_sub((), keys)
 
-        def iter_sub(prefix, next_keys):
-            this_slice = next_keys[0]
-            if type(this_slice) is slice:
-                for this_key, this_value in iris_global.iteritems(key=prefix, reverse=False, start_from=this_slice.start):
-                    if this_slice.stop is not None:
-                        this_full_key = prefix + (type(this_slice.stop)(this_key),)
-                        data = iris_global.data(this_full_key)
-                        if IrisGlobal.data_has_value(data):
-                            if this_full_key[-1] >= this_slice.stop:
-                                break
-                            yield this_full_key, this_value
-                    else:
-                        this_full_key = prefix + (this_key,)
-                        data = iris_global.data(this_full_key)
-                        if IrisGlobal.data_has_value(data):
-                            yield this_full_key, this_value
-                    if IrisGlobal.data_has_child(data) and len(next_keys) > 1:
-                        yield from iter_sub(this_full_key, next_keys[1:])
-            else:
-                # Assume this_slice is specific value instead if being an actual slice.
-                this_key = (() if prefix is None else prefix) + (this_slice,)
-                data = iris_global.data(this_key)
-                if IrisGlobal.data_has_value(data):
-                    yield this_key, iris_global[this_key]
-                if IrisGlobal.data_has_child(data) and len(next_keys) > 1:
-                    yield from iter_sub(this_key, next_keys[1:])
+    @staticmethod
+    def _numeric(sub):
+        """The subscript as a number, or None if it is a string subscript."""
+        if type(sub) in (int, float):
+            return sub
+        try:
+            return int(sub)
+        except ValueError:
+            try:
+                return float(sub)
+            except ValueError:
+                return None
+
+    @staticmethod
+    def _canonical(sub):
+        """ The subscript as a number when IRIS collates it as one, a canonical number, or None for a string.
+            "01", "1.50", "0.5", "1e3", " 1", "1_0", "nan" and "inf" are strings to IRIS, so are non finite floats.
+        """
+        kind = type(sub)
+        if kind is int or kind is bool:
+            return int(sub)
+        if kind is float:
+            return None if not math.isfinite(sub) else int(sub) if sub.is_integer() else sub
+        if kind is str:
+            if _CANONICAL_INT.fullmatch(sub):
+                return int(sub)
+            if _CANONICAL_DEC.fullmatch(sub) and not sub.startswith(("0", "-0")):
+                return float(sub)
+        return None
+
+    @staticmethod
+    def _subscript(sub):
+        """A subscript read back as a string, as an int when it is a canonical integer."""
+        return int(sub) if type(sub) is str and _CANONICAL_INT.fullmatch(sub) else sub
 
-        return {key: value for key, value in iter_sub((), keys)}
+    @staticmethod
+    def _collation(key):
+        """Sort key of a subscript tuple in collation order: canonical numbers first, in numeric order, then strings."""
+        colls = []
+        for sub in key:
+            num = IrisSlicer._canonical(sub)
+            colls.append((0, num) if num is not None else (1, str(sub)))
+        return tuple(colls)
+
+    @staticmethod
+    def _before(key, stop):
+        """Does subscript key collate before stop: canonical numbers first, in numeric order, then strings."""
+        key_num, stop_num = IrisSlicer._canonical(key), IrisSlicer._canonical(stop)
+        if key_num is not None and stop_num is not None:
+            return key_num < stop_num
+        if key_num is not None or stop_num is not None:
+            return key_num is not None
+        return str(key) < str(stop)
+
+    def _iter_sub(self, prefix, next_keys):
+        iris_global = self.iris_global
+        this_slice = next_keys[0]
+        deeper = len(next_keys) > 1
+        if type(this_slice) is slice:
+            stop = this_slice.stop
+            item_iter = iris_global.iteritems(key=prefix, reverse=False, start_from=this_slice.start)
+            while True:
+                self.round_trips += 1
+                try:
+                    this_key, this_value = next(item_iter)
+                except StopIteration:
+                    return
+                if stop is not None and not IrisSlicer._before(this_key, stop):
+                    return      # Past the stop bound, don't fetch any more.
+                this_full_key = prefix + (IrisSlicer._subscript(this_key),)
+                if this_value is not None:
+                    yield this_full_key, this_value
+                if deeper:
+                    self.round_trips += 1
+                    if IrisGlobal.data_has_child(iris_global.data(this_full_key)):
+                        yield from self._iter_sub(this_full_key, next_keys[1:])
+        else:
+            # Assume this_slice is specific value instead if being an actual slice.
+            this_key = prefix + (this_slice,)
+            if not deeper:
+                self.round_trips += 1
+                this_value = iris_global[this_key]
+                if this_value is not None:
+                    yield this_key, this_value
+                return
+            self.round_trips += 1
+            data = iris_global.data(this_key)
+            if IrisGlobal.data_has_value(data):
+                self.round_trips += 1
+                yield this_key, iris_global[this_key]
+            if IrisGlobal.data_has_child(data):
+                yield from self._iter_sub(this_key, next_keys[1:])
 
 
 class IrisConnectionException(Exception):
@@ -97,6 +191,7 @@ class IrisTransaction(object):
     def __exit__(self, ex_type, ex_value, ex_traceback):
         """Decide how we're wrapping up the transaction"""
         self.iris.pop_transaction()
+        self.iris.transaction_done(rolled_back=ex_type not in (None, IrisTransaction.BreakingGood))
         if ex_type in (None, IrisTransaction.BreakingGood):
             self.iris.iris.tCommit()
             return True     # commit() called. Commit the transaction and suppress this exception.
@@ -123,6 +218,311 @@ class IrisTransaction(object):
         raise self.BreakingReallyBad
 
 
+class IrisBatchError(Exception):
+    """Represents the failure of one batch of operations sent by an IrisBulkWriter"""
+    def __init__(self, message, batch, ops, rolled_back):
+        super().__init__(message)
+        self.batch = batch                  # Number of the failed batch, counting from 1.
+        self.ops = ops                      # The [op, subscripts, value] operations of the failed batch.
+        self.rolled_back = rolled_back      # Operations undone by rolling back the uncommitted transaction.
+
+
+class IrisLockTimeout(Exception):
+    """Iris.lock_many() couldn't take lock (global_name, key) in time, and released the locks it had taken."""
+    def __init__(self, message, lock, wait):
+        super().__init__(message)
+        self.lock = lock
+        self.wait = wait
+
+
+class IrisLockSet(object):
+    """
+    The locks taken together by Iris.lock_many(), released together by release() or on leaving a with block.
+        usage:  with iris.lock_many([(iris.MyGlob, (1,2)), ("^Other", 3)], timeout=5) as locks:
+                    locks.wait          # Seconds it took to take them all
+                    locks.locks         # [(global_name, key), ...] in the canonical order they were taken
+    """
+    def __init__(self, iris, locks, lock_mode, wait):
+        self.iris = iris
+        self.locks = locks
+        self.lock_mode = lock_mode
+        self.wait = wait
+        self.released = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, ex_traceback):
+        self.release()
+
+    def release(self, unlock_mode=None):
+        """ Unlock them all, in one round trip, with the lock_mode they were taken with, plus unlock_mode "I"mmediate
+            or "D"efer as IrisGlobal.unlock() does.
+        """
+        if self.released:
+            return
+        self.released = True
+        self.iris.iris.classMethodValue(IrisGlobal.SERVER_CLASS, "UnlockMany", json.dumps(self.locks),
+                                        self.lock_mode + (unlock_mode or ""))
+
+
+class IrisBulkWriter(object):
+    """
+    Supports Syntax like:
+                with my_glob.bulk_writer(batch_size=1000, max_latency=1, commit_every=100000) as writer:
+                    writer[1, 2, 3] = 42        # Buffered, then sent batch_size operations per round trip.
+                    writer.set((1, 2, 3), 42)   # Same as above.
+                    del writer[1, 2, 4]         # Kills are buffered in order with the sets.
+                    writer.kill((1, 2, 4))      # Same as above.
+                                                # The buffer is flushed, and the transaction committed, on exit.
+    The buffer is also flushed once its oldest operation is more than max_latency seconds old, when the next
+    operation is added. With commit_every, the batches run in transactions committed every commit_every operations.
+    A failed batch raises IrisBatchError, after rolling back the operations not yet committed.
+    On an exception in the with block, the buffer is dropped and the open transaction rolled back.
+    """
+    def __init__(self, iris_global, batch_size=1000, max_latency=None, commit_every=None):
+        self.iris_global = iris_global
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.commit_every = commit_every
+        self.buffer = []
+        self.oldest = None      # When the oldest buffered operation was added.
+        self.trans = None       # The IrisTransaction batches are sent in, with commit_every.
+        self.pending = 0        # Operations sent since the last commit.
+        self.ops = 0
+        self.batches = 0
+        self.commits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, ex_traceback):
+        if ex_type is None:
+            self.flush()
+            self._commit()
+        else:
+            self.buffer = []
+            self._rollback()
+        return False
+
+    def __setitem__(self, key=None, value=None):
+        """Support for "writer[subscripts] = value" syntax."""
+        self.set(key, value)
+
+    def __delitem__(self, key=None):
+        """Support for "del writer[subscripts]" syntax."""
+        self.kill(key)
+
+    def set(self, key=None, value=None):
+        """Buffer my_global[subscripts] = value."""
+        self._add(("S", IrisGlobal._key_tuple(key), value))
+
+    def kill(self, key=None):
+        """Buffer kill my_global[subscripts]."""
+        self._add(("K", IrisGlobal._key_tuple(key)))
+
+    def _add(self, op):
+        if not self.buffer:
+            self.oldest = time.monotonic()
+        self.buffer.append(op)
+        if len(self.buffer) >= self.batch_size or \
+                (self.max_latency is not None and time.monotonic() - self.oldest >= self.max_latency):
+            self.flush()
+
+    def flush(self):
+        """Send the buffered operations now, in one batch."""
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        if self.commit_every and self.trans is None:
+            self.trans = self.iris_global.owner.transaction()
+            self.trans.__enter__()
+        try:
+            for _ in self.iris_global._batch(batch, len(batch)):
+                pass
+        except Exception as e:
+            rolled_back = self.pending + len(batch) if self.trans is not None else 0
+            self._rollback()
+            raise IrisBatchError("Batch {} of {} operations failed: {!r}".format(self.batches + 1, len(batch), e),
+                                 self.batches + 1, batch, rolled_back) from e
+        self.batches += 1
+        self.ops += len(batch)
+        self.pending += len(batch)
+        if self.commit_every and self.pending >= self.commit_every:
+            self._commit()
+
+    def _commit(self):
+        if self.trans is not None:
+            trans, self.trans = self.trans, None
+            trans.__exit__(None, None, None)
+            self.commits += 1
+        self.pending = 0
+
+    def _rollback(self):
+        if self.trans is not None:
+            trans, self.trans = self.trans, None
+            trans.__exit__(IrisTransaction.BreakingBad, None, None)
+        self.pending = 0
+
+    def stats(self):
+        """Operations and batches sent, and transactions committed."""
+        return {"ops": self.ops, "batches": self.batches, "commits": self.commits, "buffered": len(self.buffer)}
+
+
+class IrisNode(object):
+    """
+    IrisNode is a handle on the subtree of an IrisGlobal below a fixed prefix, which caches the native methods bound to
+    the prefix so each operation does as little Python work as possible.
+    IrisNode is constructed from an IrisGlobal.node(*prefix) call. It is bound again to the native object by bind(),
+    e.g. when IrisStats swaps in its proxy.
+        usage:  node = my_glob.node(1, 2)               # Handle on ^MyGlob(1,2)
+                node[3] = 42                            # set ^MyGlob(1,2,3) = 42
+                x = node[3]                             # set x = ^MyGlob(1,2,3)
+                node[3, 4] = 42                         # set ^MyGlob(1,2,3,4) = 42
+                node.set(3, 42)                         # set ^MyGlob(1,2,3) = 42
+                del node[3]                             # kill ^MyGlob(1,2,3)
+                node.data(3)                            # $Data(^MyGlob(1,2,3))
+                node.increment(3, 1)                    # $Increment(^MyGlob(1,2,3))
+                node.node(3)                            # Handle on ^MyGlob(1,2,3)
+                for k,v in node.iteritems()             # $Order iterate key,value pairs below ^MyGlob(1,2)
+    """
+    __slots__ = ("iris_global", "ref", "iris", "_get", "_set", "_kill", "_is_defined", "_increment", "_iterator",
+                 "__weakref__")
+
+    def __init__(self, iris_global, prefix=()):
+        self.iris_global = iris_global
+        self.ref = (iris_global.global_name, *prefix)
+        self.bind(iris_global.iris)
+        iris_global.owner.handles.add(self)
+
+    def bind(self, native):
+        """Use the native object 'native' from now on, caching its methods bound to the prefix."""
+        self.iris = native
+        self._get = partial(native.get, *self.ref)
+        self._set = native.set
+        self._kill = partial(native.kill, *self.ref)
+        self._is_defined = partial(native.isDefined, *self.ref)
+        self._increment = native.increment
+        self._iterator = partial(native.iterator, *self.ref)
+
+    def node(self, *prefix):
+        """Returns an IrisNode on the subtree below this one's prefix + prefix"""
+        return IrisNode(self.iris_global, self.ref[1:] + prefix)
+
+    def __getitem__(self, key):
+        """Support for "value = my_node[subscripts]" syntax."""
+        return self._get(*key) if type(key) is tuple else self._get(key)
+
+    def get(self, key):
+        """value = my_node[subscripts]"""
+        return self._get(*key) if type(key) is tuple else self._get(key)
+
+    def __setitem__(self, key, value):
+        """Support for "my_node[subscripts] = value" syntax."""
+        if type(key) is tuple:
+            self._set(value, *self.ref, *key)
+        else:
+            self._set(value, *self.ref, key)
+
+    def set(self, key, value):
+        """my_node[subscripts] = value"""
+        if type(key) is tuple:
+            self._set(value, *self.ref, *key)
+        else:
+            self._set(value, *self.ref, key)
+
+    def __delitem__(self, key):
+        """Support for "del my_node[subscripts]" syntax."""
+        if type(key) is tuple:
+            self._kill(*key)
+        else:
+            self._kill(key)
+
+    def kill(self, key=()):
+        """Kill my_node[subscripts], or the whole subtree of this node by default."""
+        self.__delitem__(key)
+
+    def data(self, key=()):
+        """Gets the $Data(my_node[subscripts]) value, or of this node by default."""
+        return self._is_defined(*key) if type(key) is tuple else self._is_defined(key)
+
+    def increment(self, key, value=1):
+        """my_node[subscripts] += value, as an atomic action."""
+        if type(key) is tuple:
+            return self._increment(value, *self.ref, *key)
+        return self._increment(value, *self.ref, key)
+
+    def iterkeys(self, reverse=False, start_from=None):
+        """Iterate through keys below this node, optionally after a value, or in reverse"""
+        key_iter = self._iterator().subscripts().startFrom(start_from)
+        return key_iter.reversed() if reverse else key_iter
+
+    def itervalues(self, reverse=False, start_from=None):
+        """Iterate through values below this node, optionally after a value, or in reverse"""
+        value_iter = self._iterator().values().startFrom(start_from)
+        return value_iter.reversed() if reverse else value_iter
+
+    def iteritems(self, reverse=False, start_from=None):
+        """Iterate through (key,value) below this node, optionally after a value, or in reverse"""
+        item_iter = self._iterator().items().startFrom(start_from)
+        return item_iter.reversed() if reverse else item_iter
+
+
+class IrisStripedCounter(object):
+    """
+    A counter spread over 'stripes' nodes my_global(key, stripe), so that concurrent writers increment different
+    nodes instead of queueing on one, plus a sequence at my_global(key) handing out IDs a block at a time.
+        usage:  counter = my_glob.striped_counter("hits", stripes=16)    # or IrisStripedCounter(my_glob, "hits")
+                counter.increment()             # $Increment(^MyGlob("hits",stripe)), stripe by process and thread
+                counter.value()                 # Total of the stripes, in one round trip
+                counter.next_id()               # Next ID of the block reserved by $Increment(^MyGlob("hits"),block)
+                counter.reset()                 # Kill the stripes
+    IDs are unique across processes but only in order within a block, and what is left of the reserved block
+    is skipped when the counter is dropped.
+    """
+    threads = itertools.count()         # Numbers the threads of this process as they first increment.
+    thread = threading.local()
+
+    def __init__(self, iris_global, key=None, stripes=16, block=100):
+        self.iris_global = iris_global
+        self.key = IrisGlobal._key_tuple(key)
+        self.stripes = stripes
+        self.block = block
+        self.mutex = threading.Lock()
+        self.next = self.end = 0
+
+    def stripe(self):
+        """ The stripe of the calling thread, spread by process ID then by thread number. The number is redone in a
+            forked child, which would otherwise share the stripe of its parent thread.
+        """
+        pid = os.getpid()
+        number = getattr(IrisStripedCounter.thread, "number", None)
+        if number is None or number[0] != pid:
+            number = IrisStripedCounter.thread.number = (pid, pid + next(IrisStripedCounter.threads))
+        return number[1] % self.stripes
+
+    def increment(self, value=1):
+        """Add value to the stripe of the calling thread, returning the new value of that stripe."""
+        return self.iris_global.increment((*self.key, self.stripe()), value)
+
+    def value(self):
+        """The total of all the stripes."""
+        values = self.iris_global.get_many([(*self.key, stripe) for stripe in range(self.stripes)])
+        return sum(IrisSlicer._numeric(value) or 0 for value in values if value is not None)
+
+    def reset(self):
+        self.iris_global.kill_many([(*self.key, stripe) for stripe in range(self.stripes)])
+
+    def next_id(self):
+        """A unique ID, taken from a locally reserved block, with one round trip per 'block' IDs."""
+        with self.mutex:
+            if self.next >= self.end:
+                self.end = int(self.iris_global.increment(self.key, self.block)) + 1
+                self.next = self.end - self.block
+            self.next += 1
+            return self.next - 1
+
+
 class IrisGlobal(object):
     """
     IrisGlobal represents a single Iris Global of name 'global_name', accessed via a connection 'iris'
@@ -141,27 +541,71 @@ class IrisGlobal(object):
                 for k,v in my_glob.iteritems(reverse=True)  # $Order iterate in reverse
                 for k,v in my_glob.iteritems(key=(1,2),     # $Order iterate in subscripts below (1,2),
                                              start_from=1)  #                   starting from (1,2,1).
+                for k,v in my_glob.iter_all_parallel((1,),  # Depth first iterate all below (1,), 4 threads each
+                                                workers=4)  #                   scanning ranges of (1,*) subtrees.
                 for k   in my_glob.iterkeys((1,2))          # $Order iterate key             below subroot of [1,2]
                 for v   in my_glob.itervalues((1,))         # $Order iterate value           at root of ^MyGlob
                 my_glob.increment((1,2), 1)                 # $Increment(^MyGlob(1,2))
-                my_glob.lock((1,2,3))                       # lock ^MyGlob(1,2,3)
+                my_glob.lock((1,2,3))                       # lock ^MyGlob(1,2,3), True unless it timed out
                 my_glob.unlock((1,2,3))                     # unlock ^MyGlob(1,2,3)
                 my_glob.has_child((1,2,3))                  # $Data(^MyGlob(1,2,3)) = 10 or 11
                 my_glob.has_value((1,2,3))                  # $Data(^MyGlob(1,2,3)) = 1  or 11
+                my_glob.get_many([(1,2,3), (1,2,4)])        # [^MyGlob(1,2,3), ^MyGlob(1,2,4)] in one round trip
+                my_glob.set_many({(1,2,3): 42, 4: 43})      # set ^MyGlob(1,2,3) = 42, ^MyGlob(4) = 43 in one round trip
+                my_glob.kill_many([(1,2,3), 4])             # kill ^MyGlob(1,2,3), ^MyGlob(4) in one round trip
+                my_glob.count((1,))                         # Number of children of ^MyGlob(1), counted server side
+                my_glob.sum((1,), depth=None)               # Total of all values below ^MyGlob(1), also min() max()
+                my_glob.last((1,))                          # $Order(^MyGlob(1,""),-1), also first()
+                a = my_glob.to_numpy((1,), 0, 1000)         # ndarray of ^MyGlob(1,0) ... ^MyGlob(1,999)
+                my_glob.from_numpy((1,), a, offset=1000)    # set ^MyGlob(1,1000+i) = a[i]
+                my_glob.dump((1,), "myglob.snap")           # Binary snapshot of ^MyGlob(1,...), see IrisSnapshot
+                my_glob.load("myglob.snap")                 # Restore it with batched sets
+                my_cached = my_glob.cached(max_entries=1000)  # Same API, with reads served from a local LRU cache
+                my_node = my_glob.node(1,2)                 # Low overhead handle on ^MyGlob(1,2): my_node[3] = 42
+                counter = my_glob.striped_counter("hits")   # Hot counter spread over ^MyGlob("hits",0...15)
+                with my_glob.bulk_writer(commit_every=10000) as writer:   # Buffered sets and kills, sent in batches
+                    writer[1,2,3] = 42                                      # and committed every 10000 operations.
     """
+    SERVER_CLASS = "IrisWrapped.Server"     # ObjectScript class running the batched operations server side.
+    BATCH_SIZE = 1000                       # Most operations per round trip.
+    BATCH_LENGTH = 1000000                  # Most characters of JSON ops sent, and of values returned, per round trip,
+                                            # well below the 3641144 characters of an IRIS long string.
+
     def __init__(self, iris, global_name):
         self.global_name = global_name
         if not iris.is_open():
             raise Exception("IRIS Connection not open")
+        self.owner = iris
         self.iris = iris.iris
+        iris.handles.add(self)
 
     def name(self):
         """The string name of this global."""
         return self.global_name
 
-    def slicer(self):
-        """Returns an IrisSlicer object based on this IrisGlobal"""
-        return IrisSlicer(self)
+    def bind(self, native):
+        """Use the native object 'native' from now on, e.g. an IrisStats proxy."""
+        self.iris = native
+
+    def node(self, *prefix):
+        """Returns an IrisNode, a low overhead handle on the subtree of this IrisGlobal below prefix"""
+        return IrisNode(self, prefix)
+
+    def cached(self, max_entries=10000, ttl=None):
+        """Returns an IrisCachedGlobal, a read-through LRU cache in front of this IrisGlobal"""
+        return IrisCachedGlobal(self.owner, self.global_name, max_entries, ttl)
+
+    def bulk_writer(self, batch_size=1000, max_latency=None, commit_every=None):
+        """Returns an IrisBulkWriter, buffering sets and kills of this IrisGlobal into batches"""
+        return IrisBulkWriter(self, batch_size, max_latency, commit_every)
+
+    def striped_counter(self, key=None, stripes=16, block=100):
+        """Returns an IrisStripedCounter, a counter below key spread over stripes nodes, with block reserved IDs"""
+        return IrisStripedCounter(self, key, stripes, block)
+
+    def slicer(self, streaming=False):
+        """Returns an IrisSlicer object based on this IrisGlobal, yielding lazily instead of a dict when streaming"""
+        return IrisSlicer(self, streaming)
 
     def _key_params(self, key):
         """Standardised evaluation of subscripts, passed as None, singleValue or (tuple)"""
@@ -203,10 +647,7 @@ class IrisGlobal(object):
 
     def __setitem__(self, key=None, value=None):
         """Support for "my_global[subscripts] = value" syntax."""
-        try:
-            self.iris.set(*self._value_key_params(value, key))
-        except Exception as e:
-            print(repr(e))
+        self.iris.set(*self._value_key_params(value, key))
 
     def __delitem__(self, key=None):
         """Support for "del my_global[subscripts]" syntax."""
@@ -224,8 +665,9 @@ class IrisGlobal(object):
         """ lock my_global[subscripts]
             lock_mode = "S"hared, "E"scalating or "SE",
             timeout is seconds
+            Returns True when locked, False if timeout expired first.
         """
-        self.iris.lock(lock_mode, timeout, *self._key_params(key))
+        return self.iris.lock(lock_mode, timeout, *self._key_params(key))
 
     def unlock(self, key=None, lock_mode=""):
         """ Unlock my_global[subscripts]
@@ -237,6 +679,185 @@ class IrisGlobal(object):
         """Support for "value = my_global(subscripts)" syntax."""
         return self.__getitem__(args)
 
+    @staticmethod
+    def _key_tuple(key):
+        """Standardised evaluation of subscripts, passed as None, singleValue or (tuple), into a tuple."""
+        return key if type(key) is tuple else () if key is None else (key,)
+
+    def _batch(self, ops, batch_size=None):
+        """ Run [op, subscripts, value] operations server side, in round trips of up to batch_size operations and
+            BATCH_LENGTH characters each way. op is "G"et, "S"et or "K"ill. Yields one result per operation, in
+            order (None for sets and kills). Sets of bytes values, which JSON can't carry, and operations too long
+            for a round trip by themselves go through the native API instead.
+        """
+        batch_size = batch_size or IrisGlobal.BATCH_SIZE
+        batch, encoded, length = [], [], 0
+        for op in ops:
+            text = None if len(op) > 2 and isinstance(op[2], (bytes, bytearray)) else json.dumps(op)
+            if batch and (text is None or len(batch) >= batch_size or length + len(text) >= IrisGlobal.BATCH_LENGTH):
+                yield from self._send(batch, encoded)
+                batch, encoded, length = [], [], 0
+            if text is None or len(text) >= IrisGlobal.BATCH_LENGTH:
+                yield self._native(op)
+                continue
+            batch.append(op)
+            encoded.append(text)
+            length += len(text) + 1
+        if batch:
+            yield from self._send(batch, encoded)
+
+    def _send(self, batch, encoded):
+        """ Run the operations of batch, JSON encoded, in one round trip, then in more from the first one it didn't
+            run when the values returned reached BATCH_LENGTH. A get of a value too long for a round trip by itself
+            goes through the native API.
+        """
+        while batch:
+            results = json.loads(self.iris.classMethodValue(IrisGlobal.SERVER_CLASS, "Batch", self.global_name,
+                                                            "[" + ",".join(encoded) + "]", IrisGlobal.BATCH_LENGTH))
+            if not results:
+                results = [self._native(batch[0])]
+            yield from results
+            batch, encoded = batch[len(results):], encoded[len(results):]
+
+    def _native(self, op):
+        """Run one [op, subscripts, value] operation through the native API."""
+        if op[0] == "G":
+            return self.iris.get(*self._key_params(tuple(op[1])))
+        if op[0] == "S":
+            self.iris.set(*self._value_key_params(op[2], tuple(op[1])))
+        elif op[0] == "K":
+            self.iris.kill(*self._key_params(tuple(op[1])))
+        else:
+            raise Exception("Unknown batch operation: {!r}".format(op[0]))
+        return None
+
+    def get_many(self, keys, batch_size=None):
+        """Get the values of several my_global[subscripts], in key order. Undefined nodes give None."""
+        return list(self._batch((("G", IrisGlobal._key_tuple(key)) for key in keys), batch_size))
+
+    def set_many(self, items, batch_size=None):
+        """Set several my_global[subscripts] = value, from a dict or from (key, value) pairs, in order."""
+        items = items.items() if isinstance(items, dict) else items
+        for _ in self._batch((("S", IrisGlobal._key_tuple(key), value) for key, value in items), batch_size):
+            pass
+
+    def kill_many(self, keys, batch_size=None):
+        """Kill several my_global[subscripts], in order."""
+        for _ in self._batch((("K", IrisGlobal._key_tuple(key)) for key in keys), batch_size):
+            pass
+
+    def _aggregate(self, op, key, depth=1):
+        """Run the aggregate op over the nodes below key server side, in one round trip."""
+        return json.loads(self.iris.classMethodValue(IrisGlobal.SERVER_CLASS, "Aggregate", self.global_name,
+                                                     json.dumps(list(IrisGlobal._key_tuple(key))), op, depth or 0))[0]
+
+    def count(self, key=None, depth=1):
+        """The number of nodes depth levels below key, its children by default, or at any level when depth is None."""
+        return self._aggregate("count", key, depth)
+
+    def sum(self, key=None, depth=1):
+        """The total of the numeric values of the nodes depth levels below key (any level when depth is None)."""
+        return self._aggregate("sum", key, depth)
+
+    def min(self, key=None, depth=1):
+        """The least numeric value of the nodes depth levels below key, None when there are none."""
+        return self._aggregate("min", key, depth)
+
+    def max(self, key=None, depth=1):
+        """The greatest numeric value of the nodes depth levels below key, None when there are none."""
+        return self._aggregate("max", key, depth)
+
+    def first(self, key=None):
+        """$Order(my_global(key,"")), the first subscript below key, None when it has no children."""
+        return self._aggregate("first", key)
+
+    def last(self, key=None):
+        """$Order(my_global(key,""),-1), the last subscript below key, None when it has no children."""
+        return self._aggregate("last", key)
+
+    def _int_bound(self, key, reverse):
+        """ The first integer subscript below key, or past the last one in reverse, None if there are none.
+            Only canonical numbers count, strings like "01" or "nan" collate after them and are skipped.
+        """
+        for sub in self.iterkeys(key, reverse=reverse):
+            sub = IrisSlicer._canonical(sub)
+            if sub is not None:
+                return int(sub // 1) + 1 if reverse else int(-(-sub // 1))
+            if not reverse:
+                return None
+        return None
+
+    def to_numpy(self, key=None, start=None, stop=None, dtype=float, chunk=10000, fill_value=None):
+        """ Get my_global(key, i) for the integers start <= i < stop into an ndarray, fetching up to chunk subscripts
+            per round trip. start and stop default to the first and past the last integer subscripts. Nodes without a
+            value are left as fill_value, NaN for float dtypes and 0 otherwise.
+        """
+        import numpy as np
+        key = IrisGlobal._key_tuple(key)
+        dtype = np.dtype(dtype)
+        start = self._int_bound(key, False) if start is None else start
+        stop = self._int_bound(key, True) if stop is None else stop
+        if start is None or stop is None or stop <= start:
+            return np.empty(0, dtype)
+        if fill_value is None:
+            fill_value = np.nan if dtype.kind in "fc" else 0
+        array = np.full(stop - start, fill_value, dtype)
+        subscripts = json.dumps(list(key))
+        for low in range(start, stop, chunk):
+            subs, values = json.loads(self.iris.classMethodValue(IrisGlobal.SERVER_CLASS, "GetRange", self.global_name,
+                                                                 subscripts, low, min(stop, low + chunk)))
+            if subs:
+                array[np.asarray(subs, dtype=np.int64) - start] = np.asarray(values, dtype=dtype)
+        return array
+
+    def from_numpy(self, key=None, array=None, offset=0, chunk=10000):
+        """ Set my_global(key, offset + i) = array[i], sending chunk values per round trip. NaNs are not set, so a
+            to_numpy() gap stays undefined. Raises ValueError, before setting any, if array holds an infinity, which
+            JSON can't carry. Returns the number of nodes set.
+        """
+        import numpy as np
+        array = np.asarray(array)
+        if array.dtype.kind == "f" and np.isinf(array).any():
+            raise ValueError("from_numpy() can't set infinite values.")
+        subscripts = json.dumps(list(IrisGlobal._key_tuple(key)))
+        count = 0
+        for low in range(0, len(array), chunk):
+            part = array[low:low + chunk]
+            values = part.tolist()
+            if part.dtype.kind == "f":
+                for idx in np.flatnonzero(np.isnan(part)).tolist():
+                    values[idx] = None
+            count += int(self.iris.classMethodValue(IrisGlobal.SERVER_CLASS, "SetRange", self.global_name,
+                                                    subscripts, offset + low, json.dumps(values, allow_nan=False)))
+        return count
+
+    def dump(self, key=None, path=None):
+        """ Stream the nodes with a value at and below key into the snapshot file 'path', sorted with a sparse index, to
+            be read by IrisSnapshot.GlobalSnapshot or restored by load(). Returns the number of nodes written.
+        """
+        from IrisSnapshot import SnapshotWriter     # IrisSnapshot imports IrisWrapped.
+        key = IrisGlobal._key_tuple(key)
+        with SnapshotWriter(path, self.global_name, key) as writer:
+            for k, v in self.iter_all(key):
+                if v is not None:
+                    writer.write(k, v)
+            return writer.count
+
+    def load(self, path, batch_size=None):
+        """Set the nodes of the snapshot file 'path' into this global with batched sets. Returns the node count."""
+        from IrisSnapshot import GlobalSnapshot
+
+        def json_items(items):
+            for k, v in items:
+                if type(v) is bytes:    # Not JSON, so set natively.
+                    self[k] = v
+                else:
+                    yield k, v
+
+        with GlobalSnapshot(path) as snapshot:
+            self.set_many(json_items(snapshot.iter_all()), batch_size)
+            return len(snapshot)
+
     @staticmethod
     def iteritems_int_key(item_iter):
         for k, v in item_iter:
@@ -266,25 +887,370 @@ class IrisGlobal(object):
 
     def iter_all(self, key=None):
         """Depth first iterator through all (key,value), at and below 'key'."""
-        iter_stack = deque()
         key = key if type(key) is tuple else tuple() if key is None else tuple(key)
         if self.has_value(key):
             yield key, self(*key)
+        yield from self._iter_below(key)
+
+    def _iter_below(self, key):
+        """Depth first iterator through all (key,value) below 'key'."""
+        iter_stack = deque()
         iter_stack.append((key, self.iris.iterator(*self._key_params(key)).items()))
         while iter_stack:
             try:
                 k, v = next(iter_stack[-1][1])
-                try:
-                    k = int(k)
-                except ValueError:
-                    pass
-                key = tuple((*iter_stack[-1][0], k))
+                key = tuple((*iter_stack[-1][0], IrisSlicer._subscript(k)))
                 yield key, v
                 if self.has_child(key):
                     iter_stack.append((key, self.iris.iterator(*self._key_params(key)).items()))
             except StopIteration:
                 iter_stack.pop()
 
+    def _split_points(self, key, parts):
+        """ Up to parts - 1 subscripts splitting the children of key into contiguous ranges, guessed from its first and
+            last children, without reading the others: evenly spaced numbers over the numeric children, and strings
+            evenly spaced on the first character where the first and last string children differ.
+        """
+        first = next(self.iterkeys(key), None)
+        if first is None or parts < 2:
+            return []
+        last = next(self.iterkeys(key, reverse=True))
+        if not IrisSlicer._before(first, last):
+            return []
+        first_num, last_num = IrisSlicer._canonical(first), IrisSlicer._canonical(last)
+        first_str = None if first_num is not None else str(first)
+        points = []
+        if first_num is not None and last_num is None:      # Numbers then strings, split half and half.
+            last_num = IrisSlicer._canonical(next(self.iterkeys(key, reverse=True, start_from="\x00")))
+            first_str = str(next(self.iterkeys(key, start_from=last_num)))
+            points.append(first_str)
+            parts = max(parts // 2, 1)
+        if first_num is not None:
+            integers = type(first_num) is int and type(last_num) is int
+            step = (last_num - first_num) / parts
+            for idx in range(1, parts):
+                point = first_num + idx * step
+                points.append(int(point) if integers else point)
+        if first_str is not None:
+            last = str(last)
+            prefix = os.path.commonprefix([first_str, last])
+            low = ord(first_str[len(prefix)]) if len(first_str) > len(prefix) else 0
+            high = ord(last[len(prefix)])
+            for idx in range(1, parts):
+                point = prefix + chr(low + 1 + (high - low - 1) * idx // parts)
+                if IrisSlicer._canonical(point) is None:     # "5" would be the number 5.
+                    points.append(point)
+        colls = {IrisSlicer._collation((point,)): point for point in points if IrisSlicer._before(first, point)}
+        return [colls[coll] for coll in sorted(colls)]
+
+    def _plan(self, key, depth, parts):
+        """ Work units of iter_all_parallel(): ("node", key, value) for the nodes above the partition level, and
+            ("range", parent, low, high) for ranges of the nodes at the partition level, in iter_all order.
+        """
+        if depth > 1:
+            for k, v in self.iteritems(key):
+                sub = key + (IrisSlicer._subscript(k),)
+                yield "node", sub, v
+                yield from self._plan(sub, depth - 1, parts)
+        else:
+            bounds = [None] + self._split_points(key, parts) + [None]
+            for low, high in zip(bounds, bounds[1:]):
+                yield "range", key, low, high
+
+    def _iter_range(self, key, low, high):
+        """ Depth first iterator through all (key,value) of the children of key from low (included, None for the
+            first) up to high (excluded, None for past the last), and below them.
+        """
+        if low is not None:
+            sub = key + (low,)
+            data = self.data(sub)
+            if data:
+                yield sub, self(*sub) if self.data_has_value(data) else None
+            if self.data_has_child(data):
+                yield from self._iter_below(sub)
+        for k, v in self.iteritems(key, start_from=low):
+            if high is not None and not IrisSlicer._before(k, high):
+                return
+            sub = key + (IrisSlicer._subscript(k),)
+            yield sub, v
+            if self.has_child(sub):
+                yield from self._iter_below(sub)
+
+    def iter_all_parallel(self, key=None, workers=4, ordered=False, depth=1, queue_size=1000):
+        """ Parallel iter_all through all (key,value), at and below 'key'.
+            The subscripts 'depth' levels below 'key' are split into workers * 4 contiguous ranges per parent, from
+            bounds guessed without reading them, and each range is $Order'ed with its subtrees by one of 'workers'
+            threads, with a connection each. A planning thread reads the levels above the partition level, when
+            depth > 1, and hands out the ranges as the workers free up. When 'ordered' the results come in iter_all
+            order, otherwise as they're found. Workers block once 'queue_size' results are waiting for the caller,
+            which bounds memory use.
+        """
+        key = key if type(key) is tuple else tuple() if key is None else tuple(key)
+        if self.has_value(key):
+            yield key, self(*key)
+        todo = queue.Queue(workers * 4)
+        order = queue.Queue()       # The result queue of each unit in turn, when ordered.
+        results = None if ordered else queue.Queue(queue_size)
+        done = object()
+        errors = []
+        stop = threading.Event()
+
+        def put(out, item):
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(out):
+            # None once stopped, as the planner's sentinels may not reach a worker waiting on todo then
+            while not stop.is_set():
+                if errors:
+                    raise errors[0]
+                try:
+                    return out.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return None
+
+        def planner():
+            con = None
+            try:
+                con = self.owner.clone()
+                glob = IrisGlobal(con, self.global_name)
+                for unit in glob._plan(key, depth, workers * 4):
+                    out = queue.Queue(queue_size) if ordered else results
+                    if not put(todo, (unit, out)):
+                        return
+                    if ordered:
+                        order.put(out)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                for _ in threads:
+                    put(todo, None)
+                order.put(None)
+                if con is not None:
+                    con.close()
+
+        def worker():
+            con = None
+            try:
+                con = self.owner.clone()
+                glob = IrisGlobal(con, self.global_name)
+                while True:
+                    task = get(todo)
+                    if task is None:
+                        break
+                    unit, out = task
+                    if unit[0] == "node":
+                        items = [unit[1:]]
+                    else:
+                        items = glob._iter_range(*unit[1:])
+                    for item in items:
+                        if not put(out, item):
+                            return
+                    if ordered:
+                        put(out, done)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                if not ordered:
+                    put(results, done)
+                if con is not None:
+                    con.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+        plan = threading.Thread(target=planner, daemon=True)
+        for thread in threads + [plan]:
+            thread.start()
+        try:
+            if ordered:
+                out = get(order)
+                while out is not None:
+                    item = get(out)
+                    while item is not done:
+                        yield item
+                        item = get(out)
+                    out = get(order)
+            else:
+                for _ in threads:
+                    item = get(results)
+                    while item is not done:
+                        yield item
+                        item = get(results)
+        finally:
+            stop.set()
+            for thread in threads + [plan]:
+                thread.join()
+
+
+class IrisCachedGlobal(IrisGlobal):
+    """
+    IrisCachedGlobal is an IrisGlobal which keeps the values and $Data of the subscripts it reads in an LRU cache.
+    Writes, kills and increments made through it invalidate the affected entries (the whole subtree for kills), as do
+    rollbacks of the transactions they were made in. Changes made by other connections are only seen once an entry
+    is evicted or older than 'ttl' seconds.
+    IrisCachedGlobal is constructed from an IrisGlobal.cached() call.
+    usage:  my_cached = iris.MyGlob.cached(max_entries=1000, ttl=60)
+            x = my_cached[1,2,3]                        # Fetched from IRIS
+            x = my_cached[1,2,3]                        # Served from the cache
+            my_cached.stats()                           # -> {"hits": 1, "misses": 1, "evictions": 0, "entries": 1}
+    """
+    MISSING = object()
+
+    def __init__(self, iris, global_name, max_entries=10000, ttl=None):
+        super().__init__(iris, global_name)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()    # key collation -> [value, $Data, expiry], least recently used first.
+        self.dirty = []                 # (key tuple, subtree) written inside the open transaction.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        iris.caches.add(self)
+
+    def stats(self):
+        """Cache hit, miss and eviction counters, and the current number of entries."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.entries)}
+
+    def clear(self):
+        """Drop every cached entry."""
+        self.entries.clear()
+
+    @staticmethod
+    def _entry_key(key):
+        """The entry of key: its collation, as 1, 1.0 and "1" are one node."""
+        return IrisSlicer._collation(IrisGlobal._key_tuple(key))
+
+    def _lookup(self, key, field):
+        """The cached field (0 value, 1 $Data) of key, or MISSING."""
+        entry = self.entries.get(key)
+        if entry is None or entry[field] is IrisCachedGlobal.MISSING:
+            self.misses += 1
+            return IrisCachedGlobal.MISSING
+        if entry[2] is not None and entry[2] < time.monotonic():
+            del self.entries[key]
+            self.misses += 1
+            return IrisCachedGlobal.MISSING
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[field]
+
+    def _store(self, key, field, value):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [IrisCachedGlobal.MISSING, IrisCachedGlobal.MISSING,
+                                         None if self.ttl is None else time.monotonic() + self.ttl]
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.entries.move_to_end(key)
+        entry[field] = value
+        return value
+
+    def invalidate(self, key=None, subtree=False):
+        """Drop the cached entries of key, of its ancestors' $Data and, if subtree, of all its descendants."""
+        if self.owner.trans:
+            self.dirty.append((key, subtree))
+        key = IrisCachedGlobal._entry_key(key)
+        for depth in range(len(key) + 1):
+            self.entries.pop(key[:depth], None)
+        if subtree:
+            for cached_key in [k for k in self.entries if k[:len(key)] == key]:
+                del self.entries[cached_key]
+
+    def transaction_done(self, rolled_back, trans_depth):
+        """Called by Iris when a transaction level ends, invalidates what a rollback may have undone."""
+        if rolled_back:
+            dirty, self.dirty = self.dirty, []
+            for key, subtree in dirty:
+                self.invalidate(key, subtree)
+        if trans_depth == 0:
+            self.dirty = []
+
+    def data(self, key=None):
+        """Gets the $Data(global) value, from the cache when possible"""
+        k = IrisCachedGlobal._entry_key(key)
+        data = self._lookup(k, 1)
+        return self._store(k, 1, super().data(key)) if data is IrisCachedGlobal.MISSING else data
+
+    def has_child(self, key=None):
+        """Does global[subscript] have subordinate subscripts."""
+        return IrisGlobal.data_has_child(self.data(key))
+
+    def has_value(self, key=None):
+        """Does global[subscript] have a value"""
+        return IrisGlobal.data_has_value(self.data(key))
+
+    def __getitem__(self, key=None):
+        """Support for "value = my_global[subscripts]" syntax, from the cache when possible."""
+        k = IrisCachedGlobal._entry_key(key)
+        value = self._lookup(k, 0)
+        return self._store(k, 0, super().__getitem__(key)) if value is IrisCachedGlobal.MISSING else value
+
+    def get_many(self, keys, batch_size=None):
+        """Get the values of several my_global[subscripts], fetching the ones not cached in one batch."""
+        keys = [IrisGlobal._key_tuple(key) for key in keys]
+        entry_keys = [IrisSlicer._collation(key) for key in keys]
+        values = [self._lookup(key, 0) for key in entry_keys]
+        missing = [idx for idx, value in enumerate(values) if value is IrisCachedGlobal.MISSING]
+        for idx, value in zip(missing, super().get_many([keys[idx] for idx in missing], batch_size)):
+            values[idx] = self._store(entry_keys[idx], 0, value)
+        return values
+
+    def __setitem__(self, key=None, value=None):
+        """Support for "my_global[subscripts] = value" syntax."""
+        super().__setitem__(key, value)
+        self.invalidate(key)
+
+    def _batch(self, ops, batch_size=None):
+        """Run operations as IrisGlobal._batch() does, invalidating the keys that are set or killed."""
+        written = []
+
+        def record(ops):
+            for op in ops:
+                if op[0] != "G":
+                    written.append(op)
+                yield op
+
+        try:
+            yield from super()._batch(record(ops), batch_size)
+        finally:
+            for op in written:
+                self.invalidate(op[1], subtree=op[0] == "K")
+
+    def __delitem__(self, key=None):
+        """Support for "del my_global[subscripts]" syntax."""
+        try:
+            return super().__delitem__(key)
+        finally:
+            self.invalidate(key, subtree=True)
+
+    def from_numpy(self, key=None, array=None, offset=0, chunk=10000):
+        """Set my_global(key, offset + i) = array[i], as IrisGlobal.from_numpy() does."""
+        try:
+            return super().from_numpy(key, array, offset, chunk)
+        finally:
+            self.invalidate(key, subtree=True)
+
+    def load(self, path, batch_size=None):
+        """Set the nodes of a snapshot file, as IrisGlobal.load() does."""
+        try:
+            return super().load(path, batch_size)
+        finally:
+            self.invalidate(subtree=True)
+
+    def increment(self, key=None, value=1):
+        """my_global[subscripts] += value, as an atomic action."""
+        try:
+            return super().increment(key, value)
+        finally:
+            self.invalidate(key)
+
 
 class Iris(object):
     """
@@ -302,6 +1268,9 @@ class Iris(object):
 
                                 my_glob[1,2,4] = 43     # This won't happen
 
+                            with iris.lock_many([(my_glob, (1,2)), ("^Other", 3)], timeout=5) as locks:
+                                my_glob[1,2] = 44       # Both locked, in one round trip, released on exit
+
                     except IrisConnectionException as e:
                         print(repr(e))
     """
@@ -313,6 +1282,24 @@ class Iris(object):
         # Initially, no transaction is started.
         self.trans = deque()
 
+        # IrisCachedGlobal's of this connection, told about transaction rollbacks.
+        self.caches = weakref.WeakSet()
+
+        # IrisGlobal's and IrisNode's of this connection, bound again when the native object is swapped.
+        self.handles = weakref.WeakSet()
+
+        # Wait time and contention of lock_many() calls.
+        self.lock_stats = Iris.new_lock_stats()
+
+        # Keep what's needed to open more connections to the same database, see clone().
+        self.conn_args = dict(ip=ip, port=port, namespace=namespace, username=username, password=password,
+                              timeout=timeout, shared_memory=shared_memory, logfile=logfile)
+
+        if irisnative is None:
+            self.iris_connection = None
+            self.iris = None
+            raise IrisConnectionException("irisnative is not installed, use IrisLocal for an in-process stand-in.")
+
         # Make connection to InterSystems IRIS database
         #try:
         self.iris_connection = irisnative.createConnection(hostname=ip, port=port, namespace=namespace,
@@ -381,9 +1368,53 @@ class Iris(object):
         """We need better ways ti """
         self.iris_connection.close()
 
+    def ping(self):
+        """Is the connection open and answering."""
+        try:
+            return self.is_open() and self.iris.getTLevel() >= 0
+        except Exception:
+            return False
+
+    def clone(self):
+        """Open a new, independent connection to the same database, e.g. for use by another thread."""
+        return type(self)(**self.conn_args)
+
     def unlock_all(self):
         self.iris.releaseAllLocks()
 
+    @staticmethod
+    def new_lock_stats():
+        return {"calls": 0, "timeouts": 0, "locks": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    def lock_many(self, locks, lock_mode="", timeout=1):
+        """ Lock several (global, key), global being an IrisGlobal or its name, all or nothing, in one round trip.
+            They're taken in a canonical order, by global name then key collation, so that callers locking
+            overlapping sets can't deadlock. Returns an IrisLockSet, a context manager unlocking them all on exit.
+            Raises IrisLockTimeout if one can't be taken within timeout seconds, after releasing those taken.
+            Counts calls, timeouts and wait times into iris.lock_stats.
+        """
+        canonical = {}
+        for glob, key in locks:
+            name = glob.global_name if isinstance(glob, IrisGlobal) else glob if glob.startswith("^") else "^" + glob
+            key = IrisGlobal._key_tuple(key)
+            canonical.setdefault((name, IrisSlicer._collation(key)), (name, key))     # 1, 1.0 and "1" are one node.
+        canonical = [canonical[order] for order in sorted(canonical)]
+        start = time.perf_counter()
+        failed = int(self.iris.classMethodValue(IrisGlobal.SERVER_CLASS, "LockMany", json.dumps(canonical),
+                                                lock_mode, timeout))
+        wait = time.perf_counter() - start
+        stats = self.lock_stats
+        stats["calls"] += 1
+        stats["wait_total"] += wait
+        stats["wait_max"] = max(stats["wait_max"], wait)
+        if failed:
+            stats["timeouts"] += 1
+            name, key = canonical[failed - 1]
+            raise IrisLockTimeout("Timed out locking {}({})".format(name, ",".join(json.dumps(sub) for sub in key)),
+                                  (name, key), wait)
+        stats["locks"] += len(canonical)
+        return IrisLockSet(self, canonical, lock_mode, wait)
+
     def transaction(self):
         trans = IrisTransaction(self, len(self.trans))
         self.trans.append(trans)
@@ -392,6 +1423,196 @@ class Iris(object):
     def pop_transaction(self):
         self.trans.pop()
 
+    def transaction_done(self, rolled_back):
+        """Tell the IrisCachedGlobal's of this connection that a transaction level has ended."""
+        for cache in list(self.caches):
+            cache.transaction_done(rolled_back, len(self.trans))
+
+
+class IrisPoolException(Exception):
+    """Represents a failure to get a connection from an IrisPool"""
+
+
+class IrisPool(object):
+    """
+        IrisPool shares between threads from min_size up to max_size connections to an Iris database.
+            usage:  pool = IrisPool(2, 10, ip=..., port=...)    # Same connection arguments as Iris()
+                    with pool.connection() as iris:             # Waits up to 'timeout' seconds for a free connection.
+                        iris.MyGlob[1, 2, 3] = 42
+                    pool.stats()                                # Checkouts, wait times, connections opened, ...
+                    pool.close()
+        Connections are checked with Iris.ping() when checked out. Above min_size, connections idle for more than
+        max_idle seconds are closed, and every connection is closed once older than max_lifetime seconds.
+        Open transactions are rolled back and locks released when a connection is checked in.
+    """
+    def __init__(self, min_size=1, max_size=10, max_idle=300, max_lifetime=3600, timeout=30, factory=None,
+                 **conn_args):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.factory = factory if factory is not None else lambda: Iris(**conn_args)
+        self.cond = threading.Condition()
+        self.idle = deque()     # (iris, opened, last_used), most recently used last.
+        self.busy = {}          # id(iris) -> (iris, opened), for the checked out connections.
+        self.size = 0           # Connections open, idle or checked out.
+        self.closed = False
+        self.checkouts = 0
+        self.timeouts = 0
+        self.opened = 0
+        self.discarded = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent_waits = deque(maxlen=1000)
+        for _ in range(min_size):
+            self.idle.append((self._open(), time.monotonic(), time.monotonic()))
+            self.size += 1
+
+    def _open(self):
+        iris = self.factory()
+        self.opened += 1
+        return iris
+
+    @staticmethod
+    def _close(iris):
+        try:
+            iris.close()
+        except Exception:
+            pass
+
+    def _discard(self, iris):
+        self._close(iris)
+        with self.cond:
+            self.size -= 1
+            self.discarded += 1
+            self.cond.notify()
+
+    def _expired(self):
+        """ Take the idle connections out of the pool which have been idle or open for too long, freeing their place.
+            The caller holds cond, and closes them once it's released.
+        """
+        now = time.monotonic()
+        expired = [entry for entry in self.idle if now - entry[1] > self.max_lifetime]
+        idle = [entry for entry in self.idle if now - entry[1] <= self.max_lifetime]
+        while len(idle) + len(self.busy) > self.min_size and idle and now - idle[0][2] > self.max_idle:
+            expired.append(idle.pop(0))
+        self.idle = deque(idle)
+        if expired:
+            self.size -= len(expired)
+            self.discarded += len(expired)
+            self.cond.notify_all()
+        return [entry[0] for entry in expired]
+
+    def checkout(self, timeout=None):
+        """Get a connection for the exclusive use of the caller, who must give it back with checkin()."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        while True:
+            expired = []
+            try:
+                with self.cond:
+                    expired += self._expired()
+                    while not self.closed and not self.idle and self.size >= self.max_size:
+                        remaining = start + timeout - time.monotonic()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise IrisPoolException("No connection available after {} seconds.".format(timeout))
+                        self.cond.wait(remaining)
+                        expired += self._expired()
+                    if self.closed:
+                        raise IrisPoolException("IrisPool is closed.")
+                    entry = self.idle.pop() if self.idle else None
+                    if entry is None:
+                        self.size += 1
+            finally:
+                for iris in expired:
+                    self._close(iris)
+            if entry is None:
+                try:
+                    entry = (self._open(), time.monotonic(), None)
+                except Exception:
+                    with self.cond:
+                        self.size -= 1
+                        self.cond.notify()
+                    raise
+            elif not entry[0].ping():
+                self._discard(entry[0])
+                continue
+            break
+        wait = time.monotonic() - start
+        with self.cond:
+            self.busy[id(entry[0])] = entry[:2]
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.recent_waits.append(wait)
+        return entry[0]
+
+    def checkin(self, iris):
+        """Give back a connection got from checkout(), rolling back its transactions and releasing its locks."""
+        with self.cond:
+            opened = self.busy.pop(id(iris))[1]
+        try:
+            if iris.trans or iris.iris.getTLevel() > 0:
+                iris.iris.tRollback()
+                iris.trans.clear()
+                iris.transaction_done(rolled_back=True)
+            iris.unlock_all()
+        except Exception:
+            self._discard(iris)
+            return
+        now = time.monotonic()
+        if self.closed or now - opened > self.max_lifetime:
+            self._discard(iris)
+            return
+        with self.cond:
+            self.idle.append((iris, opened, now))
+            self.cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Supports "with pool.connection() as iris:" syntax."""
+        iris = self.checkout(timeout)
+        try:
+            yield iris
+        finally:
+            self.checkin(iris)
+
+    def connections(self):
+        """The connections open now, idle or checked out."""
+        with self.cond:
+            return [entry[0] for entry in self.idle] + [entry[0] for entry in self.busy.values()]
+
+    def stats(self):
+        """Pool usage counters, with wait times in seconds (percentiles over the last 1000 checkouts)."""
+        with self.cond:
+            waits = sorted(self.recent_waits)
+            return {"size": self.size, "idle": len(self.idle), "busy": len(self.busy),
+                    "checkouts": self.checkouts, "timeouts": self.timeouts,
+                    "opened": self.opened, "discarded": self.discarded,
+                    "wait_total": self.wait_total, "wait_max": self.wait_max,
+                    "wait_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+                    "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+                    "wait_p99": waits[min(len(waits) - 1, len(waits) * 99 // 100)] if waits else 0.0}
+
+    def close(self):
+        """Close the idle connections now, and the checked out ones when they're checked in."""
+        with self.cond:
+            self.closed = True
+            idle, self.idle = self.idle, deque()
+            self.cond.notify_all()
+        for iris, _, _ in idle:
+            self._discard(iris)
+
+    def __enter__(self):
+        """__enter__() and __exit__() support "with IrisPool() as pool:" syntax."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """__enter__() and __exit__() support "with IrisPool() as pool:" syntax."""
+        self.close()
+
 
 def blah_iris_simple():
     parser = argparse.ArgumentParser(description="Simple Test IrisWrapped.")
@@ -652,6 +1873,35 @@ def blah_iris_wrapped():
             rt = t3 - t2
             print("    Over {} reads  ... Read  time {:4.2f} seconds or {:8.0f}/sec".format(it, rt, it/rt))
 
+            del perf_glob[None]
+            perf_node = perf_glob.node()
+            t1 = time.time()
+            for i in range(it):
+                perf_node[i] = i
+            t2 = time.time()
+            for i in range(it):
+                _x = perf_node[i]
+            t3 = time.time()
+
+            wt = t2 - t1
+            print("    Over {} node writes ... Write time {:4.2f} seconds or {:8.0f}/sec".format(it, wt, it/wt))
+
+            rt = t3 - t2
+            print("    Over {} node reads  ... Read  time {:4.2f} seconds or {:8.0f}/sec".format(it, rt, it/rt))
+
+            del perf_glob[None]
+            t1 = time.time()
+            perf_glob.set_many((i, i) for i in range(it))
+            t2 = time.time()
+            _x = perf_glob.get_many(range(it))
+            t3 = time.time()
+
+            wt = t2 - t1
+            print("    Over {} batched writes ... Write time {:4.2f} seconds or {:8.0f}/sec".format(it, wt, it/wt))
+
+            rt = t3 - t2
+            print("    Over {} batched reads  ... Read  time {:4.2f} seconds or {:8.0f}/sec".format(it, rt, it/rt))
+
     except IrisConnectionException as e:
         print(repr(e))
         print(args)
@@ -0,0 +1,386 @@
+"""
+    Tests of IrisWrapped against the IrisLocal stand-in, needing no IRIS server.
+    Example Usage:
+        python -m pytest -q test_IrisLocal.py
+"""
+import os
+import time
+import threading
+import asyncio
+import pytest
+from IrisLocal import IrisLocal, LocalError, LocalIris, LocalStore
+from IrisWrapped import IrisBatchError, IrisGlobal, IrisLockTimeout, IrisPool, IrisSlicer, IrisStripedCounter
+from IrisAsync import AsyncIris
+from IrisSnapshot import GlobalSnapshot
+from IrisStats import IrisStats
+
+
+@pytest.fixture
+def iris():
+    with IrisLocal() as local:
+        yield local
+
+
+def test_batches_keep_order(iris, monkeypatch):
+    monkeypatch.setattr(IrisGlobal, "BATCH_SIZE", 7)
+    monkeypatch.setattr(IrisGlobal, "BATCH_LENGTH", 200)
+    glob = iris.Batch
+    items = [((i, "x" * (i % 5 + 1)), "v" * (i % 90)) for i in range(100)]
+    items += [((100,), b"\x00\xff"), ((101,), "y" * 300)]    # Set natively, not JSON, and too long for a batch.
+    glob.set_many(items)
+    keys = [key for key, _ in items]
+    values = [value.decode("latin-1") if type(value) is bytes else value for _, value in items]
+    assert glob.get_many(keys + [(999,)]) == values + [None]
+    glob.kill_many(keys[::2])
+    assert glob.get_many(keys) == [None if i % 2 == 0 else value for i, value in enumerate(values)]
+
+
+def test_set_errors_raise(iris):
+    glob = iris.Errors
+    with pytest.raises(LocalError):     # Null subscript.
+        glob[""] = 1
+    with pytest.raises(LocalError):
+        glob.cached()[1, ""] = 1
+    with pytest.raises(LocalError):
+        glob.set_many({(2,): 2, ("",): 3})
+    assert glob[2] == 2
+
+
+def test_slice_bounds(iris):
+    glob = iris.Slice
+    for sub in (-3, 0, 1, 1.5, 2, 10, "01", "1_0", " 1", "a", "b", "inf", "nan"):
+        glob[sub] = str(sub)
+    slicer = glob.slicer()     # Slices start after their start, as $Order does, and stop before their stop.
+    assert list(slicer[1:10]) == [(1.5,), (2,)]
+    assert list(slicer[:0]) == [(-3,)]
+    assert list(slicer[2:"b"]) == [(10,), (" 1",), ("01",), ("1_0",), ("a",)]
+    assert list(slicer["b":]) == [("inf",), ("nan",)]
+    assert slicer[0:1.5] == {(1,): "1"}
+    streaming = glob.slicer(streaming=True)
+    assert list(streaming[1:10]) == [((1.5,), "1.5"), ((2,), "2")]
+
+
+def test_iter_all_parallel(iris):
+    glob = iris.Scan
+    glob[None] = "root"
+    for i in range(40):
+        glob[i] = i
+        glob[i, "x"] = "x"
+        glob[i, "y", 1] = "y"
+    for sub in ("01", "a", "b", "zz"):
+        glob[sub, 1] = sub
+    expected = list(glob.iter_all())
+    assert list(glob.iter_all_parallel(workers=3, ordered=True)) == expected
+    assert list(glob.iter_all_parallel(workers=3, ordered=True, depth=2, queue_size=2)) == expected
+    assert sorted(glob.iter_all_parallel(workers=3), key=lambda item: IrisSlicer._collation(item[0])) == expected
+    assert list(glob.iter_all_parallel((5,), workers=2, ordered=True)) == list(glob.iter_all((5,)))
+    items = glob.iter_all_parallel(workers=2, queue_size=1)
+    assert next(items) == ((), "root")
+    next(items)
+    items.close()       # Stops and joins the workers, blocked on their full queue.
+
+
+def test_iter_all_parallel_close_while_planning(iris, monkeypatch):
+    plan = IrisGlobal._plan
+
+    def slow_plan(self, key, depth, parts):
+        for unit in plan(self, key, depth, parts):
+            time.sleep(0.05)
+            yield unit
+
+    monkeypatch.setattr(IrisGlobal, "_plan", slow_plan)
+    glob = iris.Plan
+    for i in range(20):
+        glob[i, "x"] = i
+    for ordered in (True, False):
+        items = glob.iter_all_parallel(workers=3, ordered=ordered, depth=2)
+        next(items)
+        # The workers wait on an empty todo queue, and the planner is still listing partitions.
+        closing = threading.Thread(target=items.close, daemon=True)
+        closing.start()
+        closing.join(5)
+        assert not closing.is_alive()
+
+
+def test_cached_global_invalidation(iris):
+    glob = iris.Cache
+    glob[1] = "a"
+    glob[1, 2] = "b"
+    cached = glob.cached(max_entries=2)
+    assert cached[1] == "a" and cached[1] == "a"
+    assert cached.stats()["hits"] == 1
+    glob[1] = "changed"         # Not through the cache, so not seen.
+    assert cached[1] == "a"
+    cached[1] = "c"
+    assert cached[1] == "c"
+    assert cached[1, 2] == "b" and cached.has_child(1)
+    del cached[1]               # Kills the subtree, with its cached entries and its parent's $Data.
+    assert cached[1, 2] is None and not cached.has_child(None)
+    cached.set_many({3: "d", 4: "e"})
+    assert cached.get_many([3, 4]) == ["d", "e"]
+    assert cached.increment(5) == 1 and cached[5] == 1
+    assert cached.stats()["evictions"] > 0
+    with iris.transaction() as tran:
+        cached[3] = "rolled back"
+        assert cached[3] == "rolled back"
+        tran.rollback_one()
+    assert cached[3] == "d"
+
+
+def test_cached_global_canonical_keys(iris):
+    cached = iris.Canon.cached()
+    cached[1] = "a"
+    assert cached[1] == "a" and cached["1"] == "a" and cached[1.0] == "a"
+    cached["1"] = "b"           # The node of 1, so its entry is invalidated too.
+    assert cached[1] == "b" and cached.get_many([1.0]) == ["b"]
+    cached[1.0, "x"] = "c"
+    assert cached.has_child(1) and cached["1", "x"] == "c"
+    del cached["1"]
+    assert cached[1] is None and not cached.has_child(1)
+
+
+def test_pool_expiry_frees_places():
+    with IrisPool(2, 2, max_lifetime=0.1, timeout=1, factory=IrisLocal) as pool:
+        time.sleep(0.2)
+        with pool.connection() as first, pool.connection() as second:
+            assert first is not second
+        stats = pool.stats()
+        assert stats["size"] == 2
+        assert stats["discarded"] == 2
+        assert stats["timeouts"] == 0
+
+
+def test_async_transaction_alongside_pooled_calls():
+    store = LocalStore()
+    pool = IrisPool(0, 2, timeout=1, factory=lambda: IrisLocal(store))
+
+    async def transaction(airis, pinned, lookups_done):
+        async with airis.transaction():
+            await asyncio.gather(airis.Async.set(2, 2), airis.Async.set(3, 3))     # One at a time, pinned.
+            pinned.set()
+            await asyncio.wait_for(lookups_done.wait(), 5)
+            await airis.Async.set(4, 4)
+
+    async def main():
+        async with AsyncIris(pool) as airis:
+            await airis.Async.set(1, 1)
+            await asyncio.gather(*(airis.run(lambda iris: time.sleep(0.1)) for _ in range(2)))     # Both in use.
+            pinned, lookups_done = asyncio.Event(), asyncio.Event()
+            trans = asyncio.ensure_future(transaction(airis, pinned, lookups_done))
+            await pinned.wait()
+            values = await asyncio.gather(*(airis.Async.get(1) for _ in range(200)))
+            lookups_done.set()
+            await trans
+            assert values == [1] * 200
+            assert await airis.Async.get_many([2, 3, 4]) == [2, 3, 4]
+            assert [key async for key in airis.Async.iterkeys()] == [1, 2, 3, 4]
+            assert pool.stats()["opened"] == 2
+
+    asyncio.run(main())
+    assert pool.stats()["timeouts"] == 0
+
+
+def test_async_free_connections_recycled():
+    store = LocalStore()
+    pool = IrisPool(0, 1, max_lifetime=0.2, timeout=1, factory=lambda: IrisLocal(store))
+
+    def fail(iris):
+        iris.iris.tStart()
+        raise LocalError("failed")
+
+    async def main():
+        async with AsyncIris(pool) as airis:
+            await airis.Async.set(1, 1)
+            with pytest.raises(LocalError):
+                await airis.run(fail)       # Checked in, rolling back its transaction.
+            assert pool.stats()["idle"] == 1 and await airis.run(lambda iris: iris.iris.getTLevel()) == 0
+            first = await airis.run(lambda iris: iris)
+            await asyncio.sleep(0.3)
+            assert await airis.run(lambda iris: iris) is not first      # Past max_lifetime, so replaced.
+            assert await airis.Async.get(1) == 1
+
+    asyncio.run(main())
+    assert pool.stats()["opened"] == 2
+
+
+def test_bulk_writer_rollback(iris):
+    glob = iris.Bulk
+    with pytest.raises(IrisBatchError) as failed:
+        with glob.bulk_writer(batch_size=2, commit_every=4) as writer:
+            for i in range(7):
+                writer[i] = i
+            writer[""] = "null subscript"
+    assert failed.value.batch == 4
+    assert failed.value.ops == [("S", (6,), 6), ("S", ("",), "null subscript")]
+    assert failed.value.rolled_back == 4
+    assert writer.stats() == {"ops": 6, "batches": 3, "commits": 1, "buffered": 0}
+    assert [key for key, _ in glob.iter_all()] == [(0,), (1,), (2,), (3,)]
+    with glob.bulk_writer(batch_size=3) as writer:
+        writer.set(1, "one")
+        del writer[2]
+        writer.kill(3)
+    assert list(glob.iteritems()) == [(0, 0), (1, "one")]
+
+
+def test_stats_histograms(iris):
+    glob = iris.Stats
+    stats = IrisStats.enable(iris)
+    assert glob.iris is iris.iris and type(iris.iris) is not LocalIris
+    for i in range(10):
+        glob[i] = i
+    assert glob.get_many(range(10)) == list(range(10))
+    assert len(list(glob.iteritems())) == 10
+    snapshot = stats.snapshot()
+    assert snapshot["ops"]["set"]["count"] == 10
+    assert snapshot["ops"]["Batch"]["count"] == 1
+    assert snapshot["ops"]["iterator"]["count"] == 11      # One per $Order, the last one finding no more.
+    assert snapshot["globals"]["^Stats"]["set"]["count"] == 10
+    set_stats = snapshot["ops"]["set"]
+    assert sum(set_stats["histogram_us"].values()) == 10
+    assert set_stats["min"] <= set_stats["p50"] <= set_stats["p99"] <= set_stats["max"]
+    assert max(set_stats["histogram_us"]) / 1e6 >= set_stats["max"]
+    IrisStats.disable(iris)
+    assert type(iris.iris) is type(glob.iris) is LocalIris
+    glob[10] = 10
+    assert stats.snapshot()["ops"]["set"]["count"] == 10
+    stats.reset()
+    assert stats.snapshot()["ops"] == {}
+
+
+def test_stats_reach_existing_handles(iris):
+    glob = IrisGlobal(iris, "^Early")
+    node = glob.node(1)
+    cached = glob.cached()
+    stats = IrisStats.enable(iris)
+    glob[1] = 1
+    node[2] = 2
+    cached[3] = 3
+    assert stats.snapshot()["globals"]["^Early"]["set"]["count"] == 3
+    IrisStats.disable(iris)
+    node[2] = 2
+    assert stats.snapshot()["globals"]["^Early"]["set"]["count"] == 3
+    with IrisPool(2, 3, factory=IrisLocal) as pool:
+        with pool.connection() as busy:
+            stats.enable_pool(pool)
+            busy.Pooled[1] = 1
+            with pool.connection() as idle, pool.connection() as opened:
+                idle.Pooled[2] = 2
+                opened.Pooled[3] = 3
+        assert stats.snapshot()["globals"]["^Pooled"]["set"]["count"] == 3
+
+
+def test_node_handles(iris):
+    glob = iris.Node
+    node = glob.node(1, 2)
+    node[3] = 42
+    node[3, 4] = "a"
+    node.set(5, "b")
+    assert glob[1, 2, 3] == node[3] == node.get(3) == 42
+    assert glob[1, 2, 3, 4] == node[3, 4] == "a"
+    assert node.data(3) == 11 and node.data(5) == 1 and node.data() == 10
+    assert node.increment(6, 2) == 2 and node.increment((6,)) == 3
+    assert list(node.iterkeys()) == [3, 5, 6]
+    assert list(node.iteritems(reverse=True, start_from=6)) == [(5, "b"), (3, 42)]
+    assert list(node.node(3).itervalues()) == ["a"]
+    del node[3, 4]
+    node.kill(5)
+    assert glob.data((1, 2, 3)) == 1 and glob[1, 2, 5] is None
+    with pytest.raises(LocalError):     # Null subscript.
+        node[""] = 1
+    node.kill()
+    assert glob.data() == 0
+
+
+def test_to_numpy_default_bounds(iris):
+    glob = iris.Array
+    glob.set_many((i, i) for i in range(1, 101))
+    glob.set_many({"01": "a", "nan": "b", "inf": "c"})      # Strings, collating after the numbers.
+    assert glob._int_bound((), False) == 1
+    assert glob._int_bound((), True) == 101
+    glob[0.5] = "d"
+    assert glob._int_bound((), False) == 1
+    iris.Strings["01"] = 1
+    assert iris.Strings._int_bound((), False) is None and iris.Strings._int_bound((), True) is None
+    pytest.importorskip("numpy")
+    assert glob.to_numpy().tolist() == [float(i) for i in range(1, 101)]
+    assert iris.Strings.to_numpy().shape == (0,)
+
+
+def test_from_numpy_gaps(iris):
+    np = pytest.importorskip("numpy")
+    glob = iris.Numbers
+    assert glob.from_numpy(None, np.array([1.0, np.nan, 3.0]), offset=1) == 2
+    assert glob[2] is None and glob.to_numpy(start=1, stop=4).tolist()[::2] == [1.0, 3.0]
+    with pytest.raises(ValueError):
+        glob.from_numpy("inf", np.array([1.0, -np.inf]))
+    assert not glob.has_child("inf")
+
+
+def test_snapshot_round_trip(iris, tmp_path):
+    glob = iris.Snap
+    nodes = {(1,): "one", (1, 2): b"\x00\xff", (1.5,): 1.5, (-3, "01"): "x", ("01",): "s", ("1_0",): "t",
+             (" 1",): "u", ("inf",): "v", ("nan", 7): 42}
+    glob.set_many(nodes)
+    path = str(tmp_path / "snap.snap")
+    assert glob.dump(path=path) == len(nodes)
+    copy = iris.Copy
+    assert copy.load(path) == len(nodes)
+    assert list(copy.iter_all()) == list(glob.iter_all())
+    with GlobalSnapshot(path) as snap:
+        assert [key for key, _ in snap.iter_all()] == [key for key, value in glob.iter_all() if value is not None]
+        assert snap["01"] == "s"
+        assert snap[1, 2] == b"\x00\xff"
+
+
+def test_lock_sets():
+    store = LocalStore()
+    with IrisLocal(store) as first, IrisLocal(store) as second:
+        locks = first.lock_many([(first.G, 2), ("G", 1), ("^G", "1"), (first.G, 1.0)])
+        assert locks.locks == [("^G", (1,)), ("^G", (2,))]
+        with pytest.raises(IrisLockTimeout):
+            second.lock_many([("G", 3), ("G", 2)], timeout=0)
+        locks.release()
+        with second.lock_many([("G", 3), ("G", 2)], timeout=0):
+            pass
+        with first.lock_many([("G", 1)], "S", timeout=0) as shared:
+            shared.release("I")
+            with second.lock_many([("G", 1)], timeout=0):
+                pass
+
+
+def test_striped_counter(iris):
+    counter = iris.Count.striped_counter("hits", stripes=4, block=10)
+    for _ in range(5):
+        counter.increment(2)
+    assert counter.value() == 10
+    ids = [counter.next_id() for _ in range(25)]
+    assert len(set(ids)) == 25
+    counter.reset()
+    assert counter.value() == 0
+
+
+def test_striped_counter_after_fork(iris):
+    counter = IrisStripedCounter(iris.Fork, "hits", stripes=1000)
+    parent = counter.stripe()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write, str(counter.stripe()).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert int(os.read(read, 16)) != parent
+
+
+def test_aggregates(iris):
+    glob = iris.Agg
+    glob.set_many({(1, 1): 5, (1, 2): "2.5", (1, 3): "abc", (1, 4, 1): -7, (1, "x"): "1e1", (2,): 1})
+    assert glob.count(1) == 5
+    assert glob.count(1, depth=None) == 6
+    assert glob.count(None, depth=2) == 5
+    assert glob.sum(1) == 5 + 2.5 + 10
+    assert glob.sum(1, depth=None) == 5 + 2.5 + 10 - 7
+    assert glob.min(1) == 2.5 and glob.min(1, depth=None) == -7
+    assert glob.max(1) == 10
+    assert glob.first(1) == 1 and glob.last(1) == "x"
+    assert glob.count(3) == 0 and glob.sum(3) == 0
+    assert glob.min(3) is None and glob.first(3) is None
@@ -0,0 +1,196 @@
+"""
+    Storage layout advisor: copies a sample of a table under each storage layout, row, columnar, and for each column
+    a columnar column (mix) or a columnar index on a row table, measures their size with bdb_sql.TableSize and the
+    cost of a query workload on them, and recommends a storage type per column with its speedup and space cost.
+    The recommended layout is built and measured too, as column choices don't add up exactly.
+    Example Usage:
+        python advisorrowcolumn.py Demo.BankTransactionRow --sample 200000
+        python advisorrowcolumn.py Demo.BankTransactionRow --sql "SELECT AVG(Amount) FROM {table}" --columns Amount
+    or from Python:
+        advice = advise("Demo.BankTransactionRow", QUERIES, sample=200000)
+    The copies are tables of the Advisor schema, dropped at the end unless kept.
+"""
+import json
+import argparse
+import numpy as np
+import iris
+import statementcache
+from utilsrowcolumn import time_sql_query, sql_columns
+from benchrowcolumn import QUERIES
+
+SCHEMA = "Advisor"
+MIN_SPEEDUP = 1.1           # Below it, a column stays row storage.
+
+
+def column_definitions(table_name):
+    """[(column, SQL type)] of the columns of table_name, in order, as SELECT * returns them."""
+    schema, name = table_name.rsplit(".", 1)
+    types = {}
+    for column, data_type, length, precision, scale in statementcache.execute(
+            "SELECT COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE "
+            "FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?", schema, name):
+        if data_type.lower() in ("varchar", "char", "varbinary", "binary") and length:
+            types[column] = f"{data_type}({length})"
+        elif data_type.lower() in ("numeric", "decimal") and precision:
+            types[column] = f"{data_type}({precision},{scale or 0})"
+        else:
+            types[column] = data_type
+    return [(column, types[column]) for column, _ in sql_columns(f"SELECT * FROM {table_name}")]
+
+
+def layouts(columns):
+    """{layout: (table storage, {column: "columnar" or "index"})} of the candidate layouts for the columns."""
+    candidates = {"row": ("ROW", {}), "columnar": ("COLUMNAR", {})}
+    for column in columns:
+        candidates[f"mix {column}"] = ("ROW", {column: "columnar"})
+        candidates[f"index {column}"] = ("ROW", {column: "index"})
+    return candidates
+
+
+def copy_name(table_name, layout):
+    name = table_name.rsplit(".", 1)[1]
+    return f"{SCHEMA}.{name}_{''.join(c if c.isalnum() else '_' for c in layout)}"
+
+
+def drop_table(table_name):
+    if iris.cls('%SYSTEM.SQL.Schema').TableExists(table_name):
+        statementcache.execute(f"DROP TABLE {table_name}")
+
+
+def create_copy(table_name, copy, definitions, storage, column_storage, sample):
+    """Create copy with the storage layout, filled with about sample rows evenly spread over table_name."""
+    drop_table(copy)
+    columns = ",\n  ".join(f"{column} {sql_type}" + (" WITH STORAGETYPE = COLUMNAR"
+                                                      if column_storage.get(column) == "columnar" else "")
+                           for column, sql_type in definitions)
+    statementcache.execute(f"CREATE TABLE {copy} (\n  {columns}\n) WITH STORAGETYPE = {storage}")
+    for column, kind in column_storage.items():
+        if kind == "index":
+            statementcache.execute(f"CREATE COLUMNAR INDEX {column}Columnar ON {copy}({column})")
+    names = ", ".join(column for column, _ in definitions)
+    rows = next(iter(statementcache.execute(f"SELECT COUNT(*) FROM {table_name}")))[0]
+    step = max(rows // sample, 1) if sample else 1
+    statementcache.execute(f"INSERT %NOINDEX INTO {copy} ({names}) SELECT TOP {sample or rows} {names} "
+                           f"FROM {table_name} WHERE %ID # {step} = 0")
+    statementcache.execute(f"BUILD INDEX FOR TABLE {copy}")
+    statementcache.execute(f"TUNE TABLE {copy}")
+
+
+def table_size(table_name):
+    """MB used by the globals of table_name, from bdb_sql.TableSize."""
+    for row in statementcache.execute(f"SELECT * FROM bdb_sql.TableSize('{table_name}')"):
+        if row[0] == "total":
+            return float(row[2])
+    return 0.0
+
+
+def workload_cost(copy, workload, weights, repeats):
+    """{query: median seconds} on copy, and their weighted sum under "total"."""
+    costs = {}
+    for name, template in workload.items():
+        sql = template.format(table=copy)
+        time_sql_query(sql, timed_prepare=False)
+        costs[name] = float(np.median([run["lookup"] + run["fetch"]
+                                       for run in (time_sql_query(sql, timed_prepare=False) for _ in range(repeats))]))
+    costs["total"] = sum(weights.get(name, 1) * costs[name] for name in workload)
+    return costs
+
+
+def measure(table_name, layout, definitions, storage, column_storage, workload, weights, sample, repeats,
+            verbose=True):
+    copy = copy_name(table_name, layout)
+    create_copy(table_name, copy, definitions, storage, column_storage, sample)
+    result = {"layout": layout, "table": copy, "storage": storage, "columns": column_storage,
+              "size": table_size(copy), "cost": workload_cost(copy, workload, weights, repeats)}
+    if verbose:
+        print(f"{layout} : {result['size']:.2f} MB, workload {result['cost']['total']:.4f} seconds")
+    return result
+
+
+def advise(table_name, workload=QUERIES, weights=None, columns=None, sample=100000, repeats=5,
+           min_speedup=MIN_SPEEDUP, keep=False, verbose=True):
+    """Measure each candidate layout of a sample of table_name under the workload, a {name: sql} dict or a list of
+        sql with {table} for the table name, weighted by weights ({name: weight}, 1 by default), and recommend
+        for each of the columns (all of them by default) row, columnar or a columnar index.
+        Returns {"layouts": [measure() results], "columns": {column: {"storage", "speedup", "space"}},
+        "recommended": measure() result with "speedup" and "space" against row}.
+    """
+    workload = workload if isinstance(workload, dict) else {sql: sql for sql in workload}
+    weights = weights or {}
+    definitions = column_definitions(table_name)
+    columns = columns or [column for column, _ in definitions]
+    results = {}
+    try:
+        for layout, (storage, column_storage) in layouts(columns).items():
+            results[layout] = measure(table_name, layout, definitions, storage, column_storage, workload, weights,
+                                      sample, repeats, verbose)
+
+        row = results["row"]
+        advice = {}
+        recommended = {}
+        for column in columns:
+            options = {"row": row, "columnar": results[f"mix {column}"], "columnar index": results[f"index {column}"]}
+            storage, best = min(options.items(), key=lambda option: option[1]["cost"]["total"])
+            speedup = row["cost"]["total"] / best["cost"]["total"] if best["cost"]["total"] else 0.0
+            if speedup < min_speedup:
+                storage, best, speedup = "row", row, 1.0
+            advice[column] = {"storage": storage, "speedup": speedup,
+                              "space": best["size"] / row["size"] if row["size"] else 0.0}
+            if storage != "row":
+                recommended[column] = "columnar" if storage == "columnar" else "index"
+
+        layout = "recommended"
+        results[layout] = measure(table_name, layout, definitions, "ROW", recommended, workload, weights, sample,
+                                  repeats, verbose) if recommended else dict(row, layout=layout)
+        for result in results.values():
+            result["speedup"] = row["cost"]["total"] / result["cost"]["total"] if result["cost"]["total"] else 0.0
+            result["space"] = result["size"] / row["size"] if row["size"] else 0.0
+    finally:
+        if not keep:
+            for layout in results:
+                drop_table(copy_name(table_name, layout))
+    if verbose:
+        report(results, advice)
+    return {"layouts": list(results.values()), "columns": advice, "recommended": results["recommended"]}
+
+
+def report(results, advice):
+    """Print the layouts with their size and workload cost against row, then the recommendation per column."""
+    print(f"{'layout':<28} {'MB':>10} {'space':>8} {'seconds':>10} {'speedup':>8}")
+    for result in results.values():
+        print(f"{result['layout'][:28]:<28} {result['size']:>10.2f} {result['space']:>8.2f} "
+              f"{result['cost']['total']:>10.4f} {result['speedup']:>8.2f}")
+    print(f"\n{'column':<28} {'storage':>16} {'speedup':>8} {'space':>8}")
+    for column, choice in advice.items():
+        print(f"{column[:28]:<28} {choice['storage']:>16} {choice['speedup']:>8.2f} {choice['space']:>8.2f}")
+    recommended = results["recommended"]
+    print(f"\nrecommended layout : {recommended['speedup']:.2f}x faster than row, "
+          f"{recommended['space']:.2f}x its space")
+    if results["columnar"]["speedup"] > recommended["speedup"]:
+        print(f"a columnar table is faster still : {results['columnar']['speedup']:.2f}x, "
+              f"{results['columnar']['space']:.2f}x the space")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend a storage type per column from a query workload.")
+    parser.add_argument("table", help="Table to advise on")
+    parser.add_argument("--queries", help="Names of the QUERIES of the workload", nargs="+", choices=list(QUERIES))
+    parser.add_argument("--sql", help="Workload queries, with {table} for the table name", nargs="+", default=[])
+    parser.add_argument("--columns", help="Columns to advise on, all of them by default", nargs="+", default=None)
+    parser.add_argument("--sample", help="Rows copied for each layout", type=int, default=100000)
+    parser.add_argument("--repeats", help="Timed runs of each query", type=int, default=5)
+    parser.add_argument("--keep", help="Keep the copies", action="store_true")
+    parser.add_argument("--json", help="JSON results file", type=str, default=None)
+    args = parser.parse_args()
+
+    workload = {name: QUERIES[name] for name in args.queries or ([] if args.sql else QUERIES)}
+    workload.update({sql: sql for sql in args.sql})
+    advice = advise(args.table, workload, columns=args.columns, sample=args.sample, repeats=args.repeats,
+                    keep=args.keep)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(advice, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+    Benchmark harness comparing SQL queries over the row, columnar, columnar index and mixed storage tables.
+    Every query runs against every table, after warm-up runs, a number of times, timing separately the prepare, the
+    statement cache lookup, the first row and the full fetch, to report percentiles and rows per second side by side.
+    Example Usage:
+        python benchrowcolumn.py --repeats 20 --json results.json --csv results.csv
+        python benchrowcolumn.py --queries avg --tables Demo.BankTransactionRow Demo.BankTransactionColumn
+        python benchrowcolumn.py --no-cache         # execute the statement prepared by each run, with no lookup
+    or from Python:
+        results = benchmark(QUERIES, LIST_TABLES, warmup=2, repeats=20)
+        compare(results)
+"""
+import csv
+import json
+import argparse
+import numpy as np
+import statementcache
+from utilsrowcolumn import time_sql_query
+
+LIST_TABLES = ["Demo.BankTransactionRow", "Demo.BankTransactionColumn", "Demo.BankTransactionIndex",
+               "Demo.BankTransactionMix"]
+
+# the queries of demo.ipynb, {table} being replaced by each table name
+QUERIES = {
+    "top": "SELECT TOP 100000 * FROM {table}",
+    "avg": "SELECT AVG(ABS(Amount)) FROM {table}",
+    "join": "SELECT TOP 100000 * FROM {table} t1 JOIN Demo.BankTransactionDescription t2 ON t1.Type = t2.Type",
+}
+
+PHASES = ("prepare", "lookup", "first_row", "fetch")
+STATS = ("min", "mean", "p50", "p90", "p99", "max")
+
+
+def summarise(runs):
+    """Statistics in seconds of each phase timed by the runs of one query, with its rows and rows per second."""
+    result = {}
+    for phase in [phase for phase in PHASES if phase in runs[0]]:
+        times = np.array([run[phase] for run in runs])
+        result[phase] = {"min": times.min(), "mean": times.mean(), "p50": np.percentile(times, 50),
+                         "p90": np.percentile(times, 90), "p99": np.percentile(times, 99), "max": times.max()}
+    result["rows"] = runs[-1]["rows"]
+    result["rows_per_sec"] = result["rows"] / result["fetch"]["p50"] if result["fetch"]["p50"] else 0.0
+    return result
+
+
+def benchmark(queries=QUERIES, tables=LIST_TABLES, warmup=1, repeats=10, params=(), verbose=True, cached=True):
+    """Run each query, a {name: sql} dict or a list of sql, on each table: warmup untimed runs then repeats timed
+        ones. Each run times a real prepare and, when cached, executes the statement taken from the statement cache,
+        timing that "lookup" too. Returns a list of {"query", "table", "sql", "warmup", "repeats",
+        phase: {stat: seconds}, "rows", "rows_per_sec"}.
+    """
+    queries = queries if isinstance(queries, dict) else {sql: sql for sql in queries}
+    results = []
+    for name, template in queries.items():
+        for table in tables:
+            sql = template.format(table=table)
+            for _ in range(warmup):
+                time_sql_query(sql, params, cached)
+            runs = [time_sql_query(sql, params, cached) for _ in range(repeats)]
+            result = {"query": name, "table": table, "sql": sql, "warmup": warmup, "repeats": repeats,
+                      **summarise(runs)}
+            results.append(result)
+            if verbose:
+                print(f"{name} on {table} : p50 {result['fetch']['p50']:.3f}s p99 {result['fetch']['p99']:.3f}s, "
+                      f"first row p50 {result['first_row']['p50']:.3f}s, row per second : {result['rows_per_sec']:,.2f}")
+    return results
+
+
+def compare(results, phase="fetch", stat="p50"):
+    """Print the phase stat of each query side by side across tables, with its ratio to the first table."""
+    tables = list(dict.fromkeys(result["table"] for result in results))
+    queries = list(dict.fromkeys(result["query"] for result in results))
+    cells = {(result["query"], result["table"]): result[phase][stat] for result in results if phase in result}
+    width = max(len(table) for table in tables) + 2
+    print(f"{phase} {stat} seconds (ratio to {tables[0]})")
+    print(f"{'query':<12}" + "".join(f"{table:>{width}}" for table in tables))
+    for query in queries:
+        base = cells.get((query, tables[0]))
+        line = f"{query[:12]:<12}"
+        for table in tables:
+            value = cells.get((query, table))
+            cell = "-" if value is None else f"{value:.3f} ({value / base:.2f}x)" if base else f"{value:.3f}"
+            line += f"{cell:>{width}}"
+        print(line)
+
+
+def write_json(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def write_csv(results, path):
+    """One line per query and table, with a column per phase and statistic."""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["query", "table", "warmup", "repeats", "rows", "rows_per_sec"] +
+                        [f"{phase}_{stat}" for phase in PHASES for stat in STATS])
+        for result in results:
+            writer.writerow([result["query"], result["table"], result["warmup"], result["repeats"], result["rows"],
+                             result["rows_per_sec"]] +
+                            [result[phase][stat] if phase in result else "" for phase in PHASES for stat in STATS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQL queries across storage layouts.")
+    parser.add_argument("--queries", help="Names of the QUERIES to run", nargs="+", choices=list(QUERIES))
+    parser.add_argument("--sql", help="Extra queries, with {table} for the table name", nargs="+", default=[])
+    parser.add_argument("--tables", help="Tables to run them on", nargs="+", default=LIST_TABLES)
+    parser.add_argument("--warmup", help="Untimed runs first", type=int, default=1)
+    parser.add_argument("--repeats", help="Timed runs", type=int, default=10)
+    parser.add_argument("--json", help="JSON results file", type=str, default=None)
+    parser.add_argument("--csv", help="CSV results file", type=str, default=None)
+    parser.add_argument("--no-cache", help="Execute the statement prepared by each run, with no cache lookup",
+                        action="store_true")
+    args = parser.parse_args()
+
+    queries = {name: QUERIES[name] for name in args.queries or QUERIES}
+    queries.update({sql: sql for sql in args.sql})
+    results = benchmark(queries, args.tables, args.warmup, args.repeats, cached=not args.no_cache)
+    compare(results)
+    compare(results, "first_row")
+    compare(results, "prepare")
+    if not args.no_cache:
+        compare(results, "lookup")
+        cache = statementcache.stats()
+        print(f"statement cache : {cache['hits']} hits, {cache['misses']} misses ({cache['hit_ratio']:.0%}), "
+              f"{cache['prepare_seconds']:.3f} seconds preparing")
+    if args.json:
+        write_json(results, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+
+
+if __name__ == '__main__':
+    main()
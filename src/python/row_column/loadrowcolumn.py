@@ -0,0 +1,200 @@
+"""
+    Load generator running a weighted mix of the demo queries from concurrent clients against each storage layout,
+    for a fixed time or number of queries, to compare throughput and latency under load rather than one query at a time.
+    Clients are threads sharing this process, or processes each with their own connection.
+    Example Usage:
+        python loadrowcolumn.py --clients 8 --duration 30
+        python loadrowcolumn.py --clients 16 --scaling --processes --mix top=1 avg=8 join=1 --csv load.csv
+    or from Python:
+        result = run_load("Demo.BankTransactionColumn", clients=8, duration=30)
+        results = load_scaling(LIST_TABLES, max_clients=16, count=2000)
+"""
+import csv
+import json
+import time
+import random
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+from utilsrowcolumn import time_sql_query
+from benchrowcolumn import LIST_TABLES, QUERIES
+
+# relative weights of the QUERIES in the mix
+MIX = {"top": 1, "avg": 4, "join": 1}
+
+
+def client_counts(max_clients):
+    """1, 2, 4 ... up to max_clients, which is always last."""
+    counts = [1]
+    while counts[-1] * 2 < max_clients:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_clients:
+        counts.append(max_clients)
+    return counts
+
+
+def _client(task):
+    """Run queries of the mix, drawn with a seeded generator, until the duration is over or count queries ran.
+        Returns the latencies and errors by query name and the elapsed seconds.
+    """
+    client, table, queries, mix, duration, count, seed = task
+    rng = random.Random(seed * 100003 + client)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    sqls = {name: queries[name].format(table=table) for name in names}
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    last_error = None
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+    done = 0
+    while (count is None or done < count) and (deadline is None or time.perf_counter() < deadline):
+        name = rng.choices(names, weights)[0]
+        try:
+            run = time_sql_query(sqls[name], timed_prepare=False)
+            latencies[name].append(run["lookup"] + run["fetch"])
+        except Exception as e:
+            errors[name] += 1
+            last_error = f"{name}: {e}"
+        done += 1
+    return {"latencies": latencies, "errors": errors, "last_error": last_error,
+            "seconds": time.perf_counter() - start}
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {"mean": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    times = np.array(latencies)
+    return {"mean": times.mean(), "p50": np.percentile(times, 50), "p90": np.percentile(times, 90),
+            "p99": np.percentile(times, 99), "max": times.max()}
+
+
+def run_load(table, clients=4, mix=MIX, duration=10, count=None, processes=False, seed=0, queries=QUERIES):
+    """Run the mix on table from `clients` concurrent clients, for duration seconds or, when count is given,
+        count queries in all. QPS counts the successful queries over the time of the slowest client.
+        Returns {"table", "clients", "mode", "queries", "errors", "seconds", "qps", "latency": {stat: seconds},
+        "per_query": {name: {"queries", "errors", "qps", stat: seconds}}, "last_error"}.
+    """
+    if count is not None:
+        duration = None
+        counts = [count // clients + (client < count % clients) for client in range(clients)]
+    else:
+        counts = [None] * clients
+    tasks = [(client, table, queries, mix, duration, counts[client], seed) for client in range(clients)]
+    if processes:
+        # spawn: a forked child would share the connection of this process
+        executor = ProcessPoolExecutor(clients, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(clients)
+    with executor:
+        runs = list(executor.map(_client, tasks))
+
+    seconds = max(run["seconds"] for run in runs)
+    per_query = {}
+    for name in mix:
+        latencies = [latency for run in runs for latency in run["latencies"][name]]
+        per_query[name] = {"queries": len(latencies), "errors": sum(run["errors"][name] for run in runs),
+                           "qps": len(latencies) / seconds if seconds else 0.0, **percentiles(latencies)}
+    latencies = [latency for run in runs for name in mix for latency in run["latencies"][name]]
+    return {"table": table, "clients": clients, "mode": "processes" if processes else "threads",
+            "queries": len(latencies), "errors": sum(query["errors"] for query in per_query.values()),
+            "seconds": seconds, "qps": len(latencies) / seconds if seconds else 0.0,
+            "latency": percentiles(latencies), "per_query": per_query,
+            "last_error": next((run["last_error"] for run in runs if run["last_error"]), None)}
+
+
+def load_scaling(tables=LIST_TABLES, max_clients=8, mix=MIX, duration=10, count=None, processes=False, seed=0,
+                 queries=QUERIES, verbose=True):
+    """run_load() on each table with 1, 2, 4 ... max_clients clients. Returns the run_load() results."""
+    results = []
+    for table in tables:
+        for clients in client_counts(max_clients):
+            result = run_load(table, clients, mix, duration, count, processes, seed, queries)
+            results.append(result)
+            if verbose:
+                print(f"{table} with {clients} clients : {result['qps']:,.1f} queries per second, "
+                      f"p50 {result['latency']['p50']:.3f}s p99 {result['latency']['p99']:.3f}s, "
+                      f"{result['errors']} errors")
+    return results
+
+
+def report(results):
+    """Print QPS, latency percentiles and errors of each run, with the speedup over the table's first run."""
+    print(f"{'table':<30} {'clients':>7} {'queries':>9} {'qps':>10} {'speedup':>8} "
+          f"{'p50':>8} {'p90':>8} {'p99':>8} {'errors':>7}")
+    base = {}
+    for result in results:
+        base.setdefault(result["table"], result["qps"])
+        speedup = result["qps"] / base[result["table"]] if base[result["table"]] else 0.0
+        latency = result["latency"]
+        print(f"{result['table'][:30]:<30} {result['clients']:>7} {result['queries']:>9,} {result['qps']:>10,.1f} "
+              f"{speedup:>8.2f} {latency['p50']:>8.3f} {latency['p90']:>8.3f} {latency['p99']:>8.3f} "
+              f"{result['errors']:>7}")
+    for result in results:
+        if result["last_error"]:
+            print(f"{result['table']} with {result['clients']} clients, last error : {result['last_error']}")
+
+
+def write_json(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def write_csv(results, path):
+    """One line per run and query, plus an "all" line per run."""
+    stats = ("mean", "p50", "p90", "p99", "max")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["table", "mode", "clients", "query", "queries", "errors", "qps"] + list(stats))
+        for result in results:
+            lines = [("all", {**result["latency"], "queries": result["queries"], "errors": result["errors"],
+                              "qps": result["qps"]})] + list(result["per_query"].items())
+            for name, line in lines:
+                writer.writerow([result["table"], result["mode"], result["clients"], name, line["queries"],
+                                 line["errors"], line["qps"]] + [line[stat] for stat in stats])
+
+
+def parse_mix(items):
+    """{name: weight} from name=weight items."""
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in QUERIES:
+            raise ValueError(f"unknown query {name}, one of {', '.join(QUERIES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent query load across storage layouts.")
+    parser.add_argument("--tables", help="Tables to load", nargs="+", default=LIST_TABLES)
+    parser.add_argument("--mix", help="Weighted QUERIES, as name=weight", nargs="+", default=None)
+    parser.add_argument("--clients", help="Concurrent clients", type=int, default=4)
+    parser.add_argument("--scaling", help="Run with 1, 2, 4 ... clients", action="store_true")
+    parser.add_argument("--duration", help="Seconds per run", type=float, default=10)
+    parser.add_argument("--count", help="Queries per run, instead of a duration", type=int, default=None)
+    parser.add_argument("--processes", help="Clients are processes rather than threads", action="store_true")
+    parser.add_argument("--seed", help="Seed of the query mix", type=int, default=0)
+    parser.add_argument("--json", help="JSON results file", type=str, default=None)
+    parser.add_argument("--csv", help="CSV results file", type=str, default=None)
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else MIX
+    except ValueError as e:
+        parser.error(str(e))
+    if args.scaling:
+        results = load_scaling(args.tables, args.clients, mix, args.duration, args.count, args.processes, args.seed)
+    else:
+        results = [run_load(table, args.clients, mix, args.duration, args.count, args.processes, args.seed)
+                   for table in args.tables]
+    report(results)
+    if args.json:
+        write_json(results, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""
+    Vectorized scans of columnar tables from Python: the vector chunk globals of the columns, resolved from the
+    table storage, are read one chunk (CHUNKSIZE rows) at a time into NumPy arrays, and filters and aggregates are
+    evaluated on whole chunks, optionally from a thread pool across chunks.
+    Number and date chunks come packed as IEEE doubles, read with np.frombuffer. String and timestamp chunks still
+    come as JSON, in slices of up to MAX_LENGTH characters.
+    Example Usage:
+        scan = VectorScan("Demo.BankTransactionColumn")
+        scan.avg("Amount", fn=np.abs)                                   # SELECT AVG(ABS(Amount))
+        scan.sum("Amount", where=lambda c: c["Type"] == "debit")        # SELECT SUM(Amount) WHERE Type = 'debit'
+        scan.count()                                                    # SELECT COUNT(*)
+        scan.group_sum("Type", "Amount")                                # SELECT Type, SUM(Amount) GROUP BY Type
+        check_scan("Demo.BankTransactionColumn")                        # The same against SQL, timed
+    Only the columnar columns of a table can be scanned: every column of a columnar table, the columns with
+    STORAGETYPE = COLUMNAR of a mixed one.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import iris
+from utilsrowcolumn import storage_globals, HOROLOG_EPOCH
+
+CHUNKSIZE = 64000       # RowColumn.Utils CHUNKSIZE
+MAX_LENGTH = 500000     # Characters of string values per RowColumn.Utils.VectorChunk() slice
+NUMERIC = ("integer", "double", "decimal")
+PACKED = NUMERIC + ("date",)    # Types RowColumn.Utils.VectorChunkPacked() packs as doubles
+
+
+def decode_chunk(vector_type, values):
+    """The elements of a chunk as an array of CHUNKSIZE: float64 with NaN where undefined for numbers,
+        datetime64[D] with NaT for dates, objects with None for strings and timestamps. values are the packed
+        doubles of numbers and dates, or the JSON values of the other types.
+    """
+    if vector_type in NUMERIC:
+        array = np.full(CHUNKSIZE, np.nan)
+        array[:len(values)] = np.asarray(values, dtype=np.float64)
+    elif vector_type == "date":
+        array = np.full(CHUNKSIZE, np.datetime64("NaT"), dtype="datetime64[D]")
+        days = np.asarray(values, dtype=np.float64)
+        defined = ~np.isnan(days)
+        array[:len(values)][defined] = (days[defined].astype(np.int64) - HOROLOG_EPOCH).astype("datetime64[D]")
+    else:
+        array = np.full(CHUNKSIZE, None, dtype=object)
+        array[:len(values)] = values
+    return array
+
+
+def defined(array):
+    """Mask of the elements of a decode_chunk() array that are defined."""
+    if array.dtype == object:
+        return np.not_equal(array, None)
+    return ~np.isnat(array) if array.dtype.kind == "M" else ~np.isnan(array)
+
+
+class VectorScan(object):
+    """
+    VectorScan reads the columnar columns of a table a chunk at a time, and reduces them chunk by chunk.
+        usage:  scan = VectorScan("Demo.BankTransactionColumn", threads=4)  # threads None scans chunk after chunk
+                scan.columns                                # -> ["AccountNumber", "TransactionDate", ...]
+                for chunk in scan.chunks(["Amount", "Type"]):   # {"Amount": array, "Type": array, "_rows": mask}
+                scan.count(column=None, where=None)         # Rows (with column defined), matching where
+                scan.sum(column, where=None, fn=None)       # Sum of fn(column), fn being vectorized, np.abs...
+                scan.avg(column, where=None, fn=None)
+                scan.min(column, where=None, fn=None), scan.max(...)
+                scan.group_sum(by, column, where=None, fn=None)  # -> {by value: sum}
+                scan.reduce(map_chunk, columns, combine)    # Generic: combine(map_chunk(chunk) for each chunk)
+        where is a function of a chunk returning a mask, such as lambda c: (c["Amount"] > 5000) & (c["Type"] == "debit")
+        A row is part of the scan when one of the scanned columns is defined for it.
+    """
+    def __init__(self, table_name, threads=None):
+        self.table_name = table_name
+        self.vectors = storage_globals(table_name)["vectors"]
+        self.columns = list(self.vectors)
+        self.threads = threads
+        self.utils = iris.cls('RowColumn.Utils')
+        self.types = {}         # column -> vector type, once a chunk of it is read
+
+    def _globals(self, columns):
+        missing = [column for column in columns if column not in self.vectors]
+        if missing:
+            raise Exception(f"Not columnar columns of {self.table_name}: {', '.join(missing)}")
+        return {column: self.vectors[column] for column in columns}
+
+    def chunk_numbers(self, columns=None):
+        """The chunk numbers of any of the columns, in order."""
+        numbers = set()
+        for vectors in self._globals(columns or self.columns).values():
+            numbers.update(json.loads(self.utils.VectorChunks(vectors)))
+        return sorted(numbers)
+
+    def read_column(self, column, vectors, number):
+        """The array of CHUNKSIZE of chunk number of column, packed for numbers and dates, in JSON slices otherwise."""
+        vector_type = self.types.get(column)
+        if vector_type is None or vector_type in PACKED:
+            vector_type, _, packed = self.utils.VectorChunkPacked(vectors, number).partition(":")
+            if vector_type in PACKED or not vector_type:
+                return decode_chunk(vector_type, np.frombuffer(packed.encode("latin-1"), dtype="<f8"))
+            self.types[column] = vector_type
+        values, start = [], 1
+        while start:
+            data = json.loads(self.utils.VectorChunk(vectors, number, start, MAX_LENGTH))
+            values += data["values"]
+            start = data["next"]
+        return decode_chunk(data["type"], values)
+
+    def read_chunk(self, number, columns=None):
+        """{column: array of CHUNKSIZE} of chunk number, with "_rows" the mask of its rows."""
+        chunk = {column: self.read_column(column, vectors, number)
+                 for column, vectors in self._globals(columns or self.columns).items()}
+        rows = np.zeros(CHUNKSIZE, dtype=bool)
+        for array in chunk.values():
+            rows |= defined(array)
+        chunk["_rows"] = rows
+        return chunk
+
+    def chunks(self, columns=None):
+        """Iterate the chunks of the columns, see read_chunk()."""
+        for number in self.chunk_numbers(columns):
+            yield self.read_chunk(number, columns)
+
+    def reduce(self, map_chunk, columns, combine):
+        """combine() of the map_chunk(chunk) results of each chunk, mapped from the thread pool when threads."""
+        columns = list(dict.fromkeys(columns))
+        numbers = self.chunk_numbers(columns)
+        task = lambda number: map_chunk(self.read_chunk(number, columns))
+        if self.threads:
+            with ThreadPoolExecutor(self.threads) as pool:
+                return combine(list(pool.map(task, numbers)))
+        return combine([task(number) for number in numbers])
+
+    def _values(self, chunk, column, where, fn):
+        """fn(column) of the rows of chunk matching where, with column defined."""
+        values = chunk[column]
+        mask = chunk["_rows"] & defined(values)
+        if where is not None:
+            mask &= where(chunk)
+        values = values[mask]
+        return fn(values) if fn is not None else values
+
+    def _where_columns(self, where, columns):
+        """The scanned columns: all of them with a where, which may use any, the given ones without."""
+        return self.columns if where is not None else columns
+
+    def count(self, column=None, where=None):
+        def map_chunk(chunk):
+            mask = chunk["_rows"] if column is None else chunk["_rows"] & defined(chunk[column])
+            if where is not None:
+                mask = mask & where(chunk)
+            return int(np.count_nonzero(mask))
+        return self.reduce(map_chunk, self._where_columns(where, [column] if column else self.columns), sum)
+
+    def sum(self, column, where=None, fn=None):
+        return self.reduce(lambda chunk: self._values(chunk, column, where, fn).sum(),
+                           self._where_columns(where, [column]), lambda sums: float(np.sum(sums)))
+
+    def avg(self, column, where=None, fn=None):
+        def map_chunk(chunk):
+            values = self._values(chunk, column, where, fn)
+            return values.sum(), len(values)
+
+        def combine(partials):
+            total, count = np.sum([partial[0] for partial in partials]), sum(partial[1] for partial in partials)
+            return float(total / count) if count else None
+        return self.reduce(map_chunk, self._where_columns(where, [column]), combine)
+
+    def _extreme(self, column, where, fn, op):
+        def map_chunk(chunk):
+            values = self._values(chunk, column, where, fn)
+            return op(values) if len(values) else None
+
+        def combine(partials):
+            partials = [partial for partial in partials if partial is not None]
+            return op(np.array(partials)) if partials else None
+        return self.reduce(map_chunk, self._where_columns(where, [column]), combine)
+
+    def min(self, column, where=None, fn=None):
+        return self._extreme(column, where, fn, np.min)
+
+    def max(self, column, where=None, fn=None):
+        return self._extreme(column, where, fn, np.max)
+
+    def group_sum(self, by, column, where=None, fn=None):
+        """{value of by: sum of fn(column)} over the rows with by and column defined."""
+        def map_chunk(chunk):
+            mask = chunk["_rows"] & defined(chunk[by]) & defined(chunk[column])
+            if where is not None:
+                mask &= where(chunk)
+            keys, inverse = np.unique(chunk[by][mask], return_inverse=True)
+            values = chunk[column][mask]
+            sums = np.bincount(inverse, weights=fn(values) if fn is not None else values, minlength=len(keys))
+            return dict(zip(keys.tolist(), sums.tolist()))
+
+        def combine(partials):
+            result = {}
+            for partial in partials:
+                for key, value in partial.items():
+                    result[key] = result.get(key, 0.0) + value
+            return result
+        return self.reduce(map_chunk, self._where_columns(where, [by, column]), combine)
+
+
+def sql_value(sql_query):
+    """The first row of a query, a single value when it has one column."""
+    row = next(iter(iris.sql.exec(sql_query)), None)
+    return row[0] if row is not None and len(row) == 1 else row
+
+
+def close(scan_result, sql_result):
+    """Whether a scan result matches an SQL one, up to float rounding, SQL NULL being a scan None or 0."""
+    if sql_result is None or scan_result is None:
+        return scan_result in (None, 0) and sql_result in (None, 0)
+    return bool(np.isclose(float(scan_result), float(sql_result)))
+
+
+def check_scan(table_name, threads=None):
+    """Run the SQL benchmark aggregates as a VectorScan and in SQL, printing both results, their times and whether
+        they match. Returns [{"name", "scan", "sql", "scan_seconds", "sql_seconds", "match"}].
+    """
+    scan = VectorScan(table_name, threads)
+    checks = [
+        ("AVG(ABS(Amount))", lambda: scan.avg("Amount", fn=np.abs),
+         lambda: sql_value(f"SELECT AVG(ABS(Amount)) FROM {table_name}")),
+        ("SUM(Amount)", lambda: scan.sum("Amount"), lambda: sql_value(f"SELECT SUM(Amount) FROM {table_name}")),
+        ("COUNT(Amount)", lambda: scan.count("Amount"),
+         lambda: sql_value(f"SELECT COUNT(Amount) FROM {table_name}")),
+        ("MAX(Amount)", lambda: scan.max("Amount"), lambda: sql_value(f"SELECT MAX(Amount) FROM {table_name}")),
+    ]
+    if "Type" in scan.columns:
+        checks.append(("SUM(Amount) BY Type", lambda: scan.group_sum("Type", "Amount"),
+                       lambda: {row[0]: row[1] for row in iris.sql.exec(
+                           f"SELECT Type, SUM(Amount) FROM {table_name} WHERE Type IS NOT NULL GROUP BY Type")}))
+    results = []
+    for name, scan_query, sql_query in checks:
+        start = time.perf_counter()
+        scan_result = scan_query()
+        scanned = time.perf_counter()
+        sql_result = sql_query()
+        end = time.perf_counter()
+        if isinstance(scan_result, dict):
+            match = scan_result.keys() == sql_result.keys() and all(
+                close(scan_result[key], sql_result[key]) for key in scan_result)
+        else:
+            match = close(scan_result, sql_result)
+        results.append({"name": name, "scan": scan_result, "sql": sql_result, "scan_seconds": scanned - start,
+                        "sql_seconds": end - scanned, "match": match})
+        print(f"{name} on {table_name} : scan {scan_result} in {scanned - start:.3f}s, "
+              f"sql {sql_result} in {end - scanned:.3f}s, {'match' if match else 'MISMATCH'}")
+    return results
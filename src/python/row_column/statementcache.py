@@ -0,0 +1,129 @@
+"""
+    LRU cache of prepared iris.sql statements, keyed by SQL text, so that a query run again with new parameters
+    is not parsed again.
+    Example Usage:
+        import statementcache
+        for row in statementcache.execute("SELECT * FROM Demo.BankTransactionRow WHERE Amount > ?", 5000):
+            print(row)
+        stmt = statementcache.prepare("INSERT INTO Demo.BankTransactionRow VALUES (?,DATE(?),?,?,?)")
+        print(statementcache.stats())   # {"hits": ..., "misses": ..., "evictions": ..., "prepare_seconds": ...}
+    Each thread has its own cache, as a prepared statement isn't meant to be shared between threads. The cache of
+    a thread that has ended is dropped, its counters kept in the totals of stats(), when the next cache is made or
+    stats() is called.
+    DDL statements aren't cached, and preparing one clears the caches of all threads, as it can change what the
+    cached statements refer to. Each cache is cleared by its own thread, before it next prepares a statement.
+"""
+import time
+import threading
+from collections import OrderedDict
+import iris
+
+MAX_SIZE = 256      # Statements kept per thread.
+DDL = ("CREATE", "DROP", "ALTER", "TRUNCATE", "BUILD", "TUNE", "GRANT", "REVOKE", "LOAD")
+
+
+class StatementCache(object):
+    """Prepared statements by SQL text, least recently used first out beyond max_size."""
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self.statements = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prepare_seconds = 0.0
+        self.generation = _generation
+
+    def prepare(self, sql):
+        """The prepared statement of sql, prepared now if it isn't cached. DDL is prepared every time, clearing
+            the caches of all threads.
+        """
+        if is_ddl(sql):
+            clear()
+            return iris.sql.prepare(sql)
+        if self.generation != _generation:     # Cleared since, e.g. by DDL prepared in another thread.
+            self.clear()
+        stmt = self.statements.get(sql)
+        if stmt is not None:
+            self.hits += 1
+            self.statements.move_to_end(sql)
+            return stmt
+        self.misses += 1
+        start = time.perf_counter()
+        stmt = iris.sql.prepare(sql)
+        self.prepare_seconds += time.perf_counter() - start
+        self.statements[sql] = stmt
+        if len(self.statements) > self.max_size:
+            self.statements.popitem(last=False)
+            self.evictions += 1
+        return stmt
+
+    def execute(self, sql, *params):
+        """Execute sql with params, through its cached statement unless it's DDL."""
+        return self.prepare(sql).execute(*params)
+
+    def clear(self):
+        self.statements.clear()
+        self.generation = _generation
+
+    def stats(self):
+        return {"size": len(self.statements), "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "prepare_seconds": self.prepare_seconds}
+
+
+_local = threading.local()
+_caches = {}        # threading.Thread -> its StatementCache
+_caches_lock = threading.Lock()
+_generation = 0     # Counts the clear() calls, for each cache to clear itself when it's behind.
+_ended = {"hits": 0, "misses": 0, "evictions": 0, "prepare_seconds": 0.0}     # Counters of the dropped caches.
+
+
+def is_ddl(sql):
+    words = sql.split(None, 1)
+    return bool(words) and words[0].upper() in DDL
+
+
+def _drop_ended():
+    """Drop the caches of the threads that have ended, adding up their counters in _ended. Needs _caches_lock."""
+    for thread in [thread for thread in _caches if not thread.is_alive()]:
+        for key, value in _caches.pop(thread).stats().items():
+            if key in _ended:
+                _ended[key] += value
+
+
+def cache():
+    """The StatementCache of the calling thread."""
+    thread_cache = getattr(_local, "cache", None)
+    if thread_cache is None:
+        thread_cache = _local.cache = StatementCache()
+        with _caches_lock:
+            _drop_ended()
+            _caches[threading.current_thread()] = thread_cache
+    return thread_cache
+
+
+def prepare(sql):
+    return cache().prepare(sql)
+
+
+def execute(sql, *params):
+    return cache().execute(sql, *params)
+
+
+def clear():
+    """Clear the caches of all threads, each one before its thread next prepares a statement."""
+    global _generation
+    with _caches_lock:
+        _generation += 1
+
+
+def stats():
+    """Hits, misses, evictions and prepare time, summed over the caches of all threads, ended ones included."""
+    with _caches_lock:
+        _drop_ended()
+        all_stats = [thread_cache.stats() for thread_cache in _caches.values()]
+        total = {"caches": len(all_stats), "size": 0, **_ended}
+    for thread_stats in all_stats:
+        for key, value in thread_stats.items():
+            total[key] += value
+    total["hit_ratio"] = total["hits"] / (total["hits"] + total["misses"]) if total["hits"] + total["misses"] else 0.0
+    return total
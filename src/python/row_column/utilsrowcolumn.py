@@ -1,77 +1,350 @@
+import os
+import csv
 import iris
+import json
 import time
 import random
+import tempfile
+import itertools
+import multiprocessing
 import datetime
 import string
 import numpy as np
+import statementcache
 
 # pylint: disable-all
 
-def duplicate_rows(count,table_name: str):
+def storage_globals(table_name: str):
+    """The storage globals of table_name, resolved from its class storage definition:
+        {"class", "data": row data global, "id": ID counter, "vectors": {column: vector chunk global}}
+    """
+    return json.loads(iris.cls('RowColumn.Utils').Storage(table_name))
 
-    if (table_name == "Demo.BankTransactionColumn"):
+def duplicate_rows(count,table_name: str,times=1):
+    """Append `times` copies of the first `count` rows (all of them when None) of any table, server side:
+        its row data and columnar vector chunk globals are resolved from its storage definition. Each row data
+        node is merged to its new ID. A vector chunk whose rows keep their position is copied with one SET, the
+        others element by element. Indices aren't copied, build them afterwards.
+        Returns the new number of rows.
+    """
+    return iris.cls('RowColumn.Utils').DuplicateRows(table_name, times, -1 if count is None else count)
 
-        g = iris.gref("^CATa.BJqo.1")
 
-    elif (table_name == "Demo.BankTransactionIndex"):
+# time one run of an sql query: a real prepare, then first row and all rows after execution starts
+# cached also times taking the statement from the statement cache, as "lookup", and executes that one instead
+# timed_prepare=False skips the real prepare of a cached run, for callers only after the query time
+def time_sql_query(sql_query, params=(), cached=True, timed_prepare=True):
+    run = {}
+    prepared = time.perf_counter()
+    if timed_prepare or not cached:
+        stmt = iris.sql.prepare(sql_query)
+        run["prepare"] = time.perf_counter() - prepared
+        prepared = time.perf_counter()
+    if cached:
+        stmt = statementcache.prepare(sql_query)
+        looked_up = time.perf_counter()
+        run["lookup"] = looked_up - prepared
+        prepared = looked_up
+    i = 0
+    first_row = None
+    for row in stmt.execute(*params):
+        if first_row is None:
+            first_row = time.perf_counter()
+        i=i+1
+    end = time.perf_counter()
+    run.update({"first_row": (first_row or end) - prepared, "fetch": end - prepared, "rows": i})
+    return run
 
-        g = iris.gref("^CATa.C4g3.1")
+# benchmark an sql query, see benchrowcolumn for repeated runs with statistics
+def benchmark_sql_query(sql_query):
+    run = time_sql_query(sql_query)
+    print(f"number of rows : {run['rows']}")
+    print(f"{sql_query} in {run['prepare'] + run['fetch']:.2f} seconds (prepare {run['prepare']:.3f}, first row {run['first_row']:.3f}), row per second : {run['rows']/run['fetch']:,.2f}")
 
-    elif (table_name == "Demo.BankTransactionMix"):
+# print result of sql query
+def print_sql_query(sql_query):
+    print(f"{sql_query} :")
+    rs = statementcache.execute(sql_query)
+    for row in rs:
+        print(row)
+
+def run_sql_query(sql_query):
+    rs = statementcache.execute(sql_query)
+    for row in rs:
+        print(row)
 
-        g = iris.gref("^CATa.CfQt.1")
+# numpy kind of the ODBC type of a column
+ODBC_KINDS = {-7: "int", -6: "int", 5: "int", 4: "int", -5: "int", 2: "float", 3: "float", 6: "float", 7: "float",
+              8: "float", 9: "date", 91: "date", 11: "timestamp", 93: "timestamp"}
+HOROLOG_EPOCH = 47117  # $horolog of 1970-01-01
 
-    elif (table_name == "Demo.BankTransactionRow"): # row storage
-        g = iris.gref("^CATa.BArF.1")
+def sql_columns(sql_query):
+    """[(name, ODBC type)] of the columns of a query, from its %SQL.Statement metadata."""
+    stmt = iris.cls('%SQL.Statement')._New()
+    status = stmt._Prepare(sql_query)
+    if iris.cls('%SYSTEM.Status').IsError(status):
+        raise Exception(iris.cls('%SYSTEM.Status').GetErrorText(status))
+    columns = stmt._Metadata.columns
+    return [(columns.GetAt(i).colName, columns.GetAt(i).ODBCType) for i in range(1, columns.Count() + 1)]
 
-    else:
-        print("Table name not found")
+def value_kind(values):
+    """numpy kind of a column from its first non null value, when it has no ODBC type."""
+    value = next((value for value in values if value is not None), None)
+    if isinstance(value, bool) or isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, datetime.datetime):
+        return "timestamp"
+    if isinstance(value, datetime.date):
+        return "date"
+    return "object"
+
+def column_array(values, kind):
+    """A column of values as a typed array: int64 (float64 when it has nulls), float64 with NaN for nulls,
+        datetime64[D] dates (from dates, ISO strings or $horolog days), datetime64[us] timestamps, or objects.
+    """
+    if kind == "int":
+        try:
+            return np.array(values, dtype=np.int64)
+        except (TypeError, ValueError):
+            return np.array(values, dtype=np.float64)
+    if kind == "float":
+        return np.array(values, dtype=np.float64)
+    if kind in ("date", "timestamp"):
+        unit = "datetime64[D]" if kind == "date" else "datetime64[us]"
+        if kind == "date" and isinstance(next((value for value in values if value is not None), None), int):
+            days = np.array([HOROLOG_EPOCH if value is None else value for value in values], dtype=np.int64)
+            array = (days - HOROLOG_EPOCH).astype(unit)
+            array[[value is None for value in values]] = np.datetime64("NaT")
+            return array
+        return np.array(values, dtype=unit)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+class ColumnBatches(object):
+    """
+    A result set read batch_size rows at a time into one NumPy array per column, see fetch_columns().
+        usage:  batches = fetch_columns("SELECT Amount, Type FROM Demo.BankTransactionColumn")
+                batches.columns                     # -> ["Amount", "Type"]
+                for batch in batches.iter_batches():  # {"Amount": float64 array, "Type": object array}
+                arrays = batches.to_arrays()        # or all of them at once, concatenated
+    """
+    def __init__(self, sql_query, params=(), batch_size=65536, dtypes=None):
+        try:
+            self.columns, odbc_types = map(list, zip(*sql_columns(sql_query)))
+            self.kinds = [ODBC_KINDS.get(odbc_type, "object") for odbc_type in odbc_types]
+        except Exception:
+            self.columns, self.kinds = None, None
+        self.dtypes = dtypes or {}
+        self.batch_size = batch_size
+        self.rows = iter(statementcache.prepare(sql_query).execute(*params))
+
+    def __iter__(self):
+        return self.iter_batches()
+
+    def iter_batches(self):
+        """Yield {column: array} for each batch of up to batch_size rows."""
+        while True:
+            rows = list(itertools.islice(self.rows, self.batch_size))
+            if not rows:
+                return
+            values = list(zip(*rows))
+            if self.columns is None:
+                self.columns = [f"Column{i + 1}" for i in range(len(values))]
+            if self.kinds is None:
+                self.kinds = [value_kind(column) for column in values]
+            yield {column: np.array(column_values, dtype=self.dtypes[column]) if column in self.dtypes
+                   else column_array(column_values, kind)
+                   for column, kind, column_values in zip(self.columns, self.kinds, values)}
+
+    def to_arrays(self):
+        """All the remaining rows as {column: array}."""
+        batches = list(self.iter_batches())
+        if not batches:
+            return {column: np.array([], dtype=self.dtypes.get(column, object)) for column in self.columns or []}
+        return {column: np.concatenate([batch[column] for batch in batches]) for column in self.columns}
+
+# stream the result of an sql query as batches of NumPy arrays, one per column, instead of a list per row
+def fetch_columns(sql_query, params=(), batch_size=65536, dtypes=None):
+    return ColumnBatches(sql_query, params, batch_size, dtypes)
+
+# columns of the Demo.BankTransaction* tables, in table order, and the words of their Description
+FAKE_COLUMNS = ("AccountNumber", "TransactionDate", "Description", "Amount", "Type")
+FAKE_WORDS = ['Rent', 'Salary', 'Food', 'Clothes', 'Car', 'Phone', 'Internet', 'Insurance', 'Other', None]
+
+def fake_data_chunk(size, rng):
+    """`size` fake bank transactions as one NumPy array per column, drawn as create_n_fake_data draws a row:
+        account numbers, ISO dates in 2018, descriptions (some None), amounts and types.
+    """
+    return {
+        "AccountNumber": rng.integers(1000000, 1001001, size),
+        "TransactionDate": (np.datetime64("2018-01-01") + rng.integers(0, 365, size)).astype(str),
+        "Description": rng.choice(np.array(FAKE_WORDS, dtype=object), size),
+        "Amount": rng.uniform(0, 10000, size),
+        "Type": rng.choice(np.array(['credit', 'debit']), size),
+    }
+
+def load_fake_chunk(data, list_tables, method="load", statements=None, noindex=False):
+    """Insert a fake_data_chunk() into each table.
+        method "load" runs one LOAD DATA per table from a CSV file of the chunk, %NOINDEX when noindex.
+        "prepared" executes one prepared INSERT per table for every row, a round trip per row: it is the per-row
+        baseline to compare "load" against, not a bulk path.
+    """
+    columns = ", ".join(FAKE_COLUMNS)
+    rows = zip(*(data[column].tolist() for column in FAKE_COLUMNS))
+    if method == "load":
+        load = "LOAD %NOINDEX DATA" if noindex else "LOAD DATA"
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(fd, "w", newline="") as f:
+                csv.writer(f).writerows(rows)
+            for table in list_tables:
+                iris.sql.exec(f"{load} FROM FILE '{path}' INTO {table} ({columns})")
+        finally:
+            os.remove(path)
         return
+    rows = list(rows)
+    statements = statements or fake_insert_statements(list_tables)
+    for table in list_tables:
+        stmt = statements[table]
+        for row in rows:
+            stmt.execute(*row)
 
-    max = g[None]
-    if count >= 64000:
-        count = 64000
+def fake_insert_statements(list_tables, noindex=False):
+    """A prepared INSERT of the FAKE_COLUMNS for each table, %NOINDEX (leaving its indices to build) when noindex."""
+    columns = ", ".join(FAKE_COLUMNS)
+    insert = "INSERT %NOINDEX INTO" if noindex else "INSERT INTO"
+    return {table: statementcache.prepare(f"{insert} {table} ({columns}) VALUES (?,DATE(?),?,?,?)") for table in list_tables}
 
-    for i in range(count):
-        g[max+i+1]=g[i+1]
+def insert_fake_data(n, list_tables, chunk_size=64000, seed=None, method="load", verbose=True, noindex=False):
+    """Insert n fake rows into each table, generated `chunk_size` rows at a time as NumPy arrays and loaded
+        by load_fake_chunk() `method`, printing rows per second for every chunk. Returns the number of rows inserted.
+    """
+    rng = np.random.default_rng(seed)
+    statements = fake_insert_statements(list_tables, noindex) if method == "prepared" else None
+    x = 0
+    start = time.perf_counter()
+    for chunk, first in enumerate(range(0, n, chunk_size)):
+        chunk_start = time.perf_counter()
+        size = min(chunk_size, n - first)
+        load_fake_chunk(fake_data_chunk(size, rng), list_tables, method, statements, noindex)
+        rows = size * len(list_tables)
+        x = x + rows
+        elapsed = time.perf_counter() - chunk_start
+        if verbose:
+            print(f"chunk {chunk} : {rows:,} rows in {elapsed:.2f} seconds, rows per second : {rows/elapsed:,.2f}")
+    end = time.perf_counter()
+    if verbose:
+        print(f"created {x:,} fake data in {end - start:.2f} seconds, number of rows per second : {x/(end - start):,.2f}")
+    return x
 
-    g[None] = max+count
+# statements of a parallel_load worker process, prepared once by _init_loader
+_loader = {}
 
-    if table_name == "Demo.BankTransactionColumn":
-        iris.cls('RowColumn.Utils').AppendLastVector()
-    if table_name == "Demo.BankTransactionMix":
-        iris.cls('RowColumn.Utils').AppendLastVectorMix()
-    
+def _init_loader(list_tables, method):
+    _loader["statements"] = fake_insert_statements(list_tables) if method == "prepared" else None
 
+def _load_partition(task):
+    """Load partition `partition` of rows [first, first + size) into every table, in a worker process."""
+    partition, first, size, list_tables, seed, method = task
+    start = time.perf_counter()
+    # the seed depends on the partition only, so the data is the same whatever the number of workers
+    data = fake_data_chunk(size, np.random.default_rng([seed, partition]))
+    load_fake_chunk(data, list_tables, method, _loader["statements"])
+    return size * len(list_tables), time.perf_counter() - start
 
-# benchmark an sql query
-def benchmark_sql_query(sql_query):
-    start = time.time()
-    rs= iris.sql.exec(sql_query)
-    i = 0
-    for row in rs :
-        i=i+1
-    end = time.time()
-    print(f"number of rows : {i}")
-    print(f"{sql_query} in {end - start:.2f} seconds, row per second : {(i)/(end - start):,.2f}")
+def parallel_load(n, list_tables, workers=4, chunk_size=64000, seed=0, method="load", verbose=True):
+    """Insert n fake rows into each table from `workers` processes, each with its own connection.
+        The rows are split into partitions of chunk_size rows with deterministic seeds, handed to the workers
+        as they free up. Returns {"workers", "rows", "seconds", "rows_per_sec"}.
+    """
+    tasks = [(partition, first, min(chunk_size, n - first), list_tables, seed, method)
+             for partition, first in enumerate(range(0, n, chunk_size))]
+    x = 0
+    start = time.perf_counter()
+    # spawn: a forked child would share the connection of this process
+    with multiprocessing.get_context("spawn").Pool(workers, _init_loader, (list_tables, method)) as pool:
+        for rows, seconds in pool.imap_unordered(_load_partition, tasks):
+            x = x + rows
+            if verbose:
+                print(f"\r{x/(n*len(list_tables))*100:.1f}%", end='')
+    end = time.perf_counter()
+    result = {"workers": workers, "rows": x, "seconds": end - start, "rows_per_sec": x / (end - start)}
+    if verbose:
+        print(f"\n{workers} workers created {x:,} fake data in {end - start:.2f} seconds, number of rows per second : {x/(end - start):,.2f}")
+    return result
 
-# print result of sql query
-def print_sql_query(sql_query):
-    print(f"{sql_query} :")
-    rs = iris.sql.exec(sql_query)
-    for row in rs:
-        print(row)
+def parallel_load_scaling(n, list_tables, max_workers=None, chunk_size=64000, seed=0, method="load", truncate=False):
+    """Run parallel_load() with 1, 2, 4 ... max_workers (default the CPU count) workers and print how the
+        throughput scales. truncate empties the tables before each run, so they all load into the same table size.
+        Returns the parallel_load() results.
+    """
+    max_workers = max_workers or os.cpu_count()
+    counts = [1]
+    while counts[-1] * 2 < max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    results = []
+    for workers in counts:
+        if truncate:
+            for table in list_tables:
+                iris.sql.exec(f"TRUNCATE TABLE {table}")
+        results.append(parallel_load(n, list_tables, workers, chunk_size, seed, method, verbose=False))
+    print(f"{'workers':>8} {'rows':>14} {'seconds':>10} {'rows/sec':>14} {'speedup':>8} {'efficiency':>10}")
+    for result in results:
+        speedup = result["rows_per_sec"] / results[0]["rows_per_sec"]
+        print(f"{result['workers']:>8} {result['rows']:>14,} {result['seconds']:>10.2f} {result['rows_per_sec']:>14,.0f} "
+              f"{speedup:>8.2f} {speedup/result['workers']:>10.0%}")
+    return results
 
-def run_sql_query(sql_query):
-    rs = iris.sql.exec(sql_query)
-    for row in rs:
-        print(row)
+def _build_index(table, start_id=None):
+    start = time.perf_counter()
+    if start_id is None:
+        statementcache.execute(f"BUILD INDEX FOR TABLE {table}")
+    else:
+        # rows from start_id on only, keeping the index entries and the statistics of the rows before
+        status = iris.cls(storage_globals(table)["class"])._BuildIndices("", 0, 0, "", start_id, "", "", 1)
+        if iris.cls('%SYSTEM.Status').IsError(status):
+            raise Exception(iris.cls('%SYSTEM.Status').GetErrorText(status))
+    return table, time.perf_counter() - start
 
-# create n fake data written in a csv file with a progress bar
-def create_n_fake_data(n,m,list_tables):
+def build_indices(list_tables, parallel=False, start_ids=None):
+    """Build the indices of each table, from one process per table when parallel. With start_ids
+        ({table: row id}), only the rows from that id on are indexed. Returns {table: seconds}.
+    """
+    tasks = [(table, (start_ids or {}).get(table)) for table in list_tables]
+    if parallel and len(list_tables) > 1:
+        # spawn: a forked child would share the connection of this process
+        with multiprocessing.get_context("spawn").Pool(len(list_tables)) as pool:
+            return dict(pool.starmap(_build_index, tasks))
+    return dict(_build_index(*task) for task in tasks)
 
-    if n<64000 and m>0:
-        raise Exception("n must be greater than 64000 to run duplicate_rows")
+def tune_tables(list_tables, rows=None):
+    """TUNE TABLE each table. When its statistics were tuned on a sample of rows, rows ({table: row count}) sets
+        the extent size to the full row count. Returns {table: seconds}.
+    """
+    seconds = {}
+    for table in list_tables:
+        start = time.perf_counter()
+        if rows is None:
+            statementcache.execute(f"TUNE TABLE {table}")
+        else:
+            schema, name = table.rsplit(".", 1)
+            iris.cls('%SYSTEM.SQL.Stats.Table').SetExtentSize(schema, name, rows[table])
+        seconds[table] = time.perf_counter() - start
+    return seconds
+
+# create n fake data, then duplicate them m times and build the indices and statistics once
+# vectorized generates them by chunks of NumPy arrays and loads each chunk with LOAD DATA
+# bulk inserts them without maintaining the indices, duplicates all m copies at once, and builds the indices
+# at the end, in parallel across tables with parallel_index. tune_sample tunes the statistics on the n created
+# rows, which the duplicates copy, before duplicating them, rather than on the full tables.
+# Returns the seconds of each phase.
+def create_n_fake_data(n,m,list_tables,vectorized=False,chunk_size=64000,seed=None,bulk=False,parallel_index=False,
+                       tune_sample=False):
 
     def random_string():
         """Generate a random string 
@@ -95,46 +368,84 @@ def create_n_fake_data(n,m,list_tables):
     def random_account_number():
         return random.randint(1000000, 1001000)
 
-    x = 0
+    phases = {}
     start = time.time()
-    for i in range(n):
-        # progress bar tqdm
-        # display every 0.1%
-        if i % (n // 1000) == 0:
-            print(f"\r{(i+1)/n*100:.1f}%", end='')
-        data = [
-            random_account_number(),
-            random_date(datetime.date(2018, 1, 1), datetime.date(2019, 1, 1)),
-            random_string(),
-            random_amount(),
-            random_type()
-        ]
-        for table in list_tables:
-            x=x+1
-            iris.sql.exec(f"INSERT INTO {table} VALUES (?,DATE(?),?,?,?)", data[0],data[1].isoformat(),data[2],data[3],data[4])
-    end = time.time()        
-    print(f"\ncreated {x:,} fake data in {end - start:.2f} seconds, number of rows per second : {x/(end - start):,.2f}")
-
-    if m>0:
-        start = time.time()
-        for i in range(m):
-            print(f"\r{(i+1)/m*100:.1f}%", end='')
+    if vectorized:
+        insert_fake_data(n, list_tables, chunk_size, seed, noindex=bulk)
+    else:
+        insert = "INSERT %NOINDEX INTO" if bulk else "INSERT INTO"
+        x = 0
+        for i in range(n):
+            # progress bar tqdm
+            # display every 0.1%
+            if i % max(n // 1000, 1) == 0:
+                print(f"\r{(i+1)/n*100:.1f}%", end='')
+            data = [
+                random_account_number(),
+                random_date(datetime.date(2018, 1, 1), datetime.date(2019, 1, 1)),
+                random_string(),
+                random_amount(),
+                random_type()
+            ]
             for table in list_tables:
-                duplicate_rows(n,table)
+                x=x+1
+                statementcache.execute(f"{insert} {table} VALUES (?,DATE(?),?,?,?)", data[0],data[1].isoformat(),data[2],data[3],data[4])
+        end = time.time()        
+        print(f"\ncreated {x:,} fake data in {end - start:.2f} seconds, number of rows per second : {x/(end - start):,.2f}")
+    phases["insert"] = time.time() - start
 
-        
-            # build index
+    rows = None
+    start_ids = None
+    if tune_sample:
+        start = time.time()
+        if bulk:
+            # the statistics of an index come from the index, build them before tuning
             print("build index")
-            for table in list_tables:
-                run_sql_query(f"build index for table {table}")
-            # tune table
-            print("tune table")
-            for table in list_tables:
-                run_sql_query("TUNE TABLE %s" % table)
+            build_indices(list_tables, parallel_index)
+            phases["build index"] = time.time() - start
+        print("tune table on the created rows")
+        tune_tables(list_tables)
+        phases["tune table"] = time.time() - start - phases.get("build index", 0)
+        rows = {}
+        # the sample is indexed already, only index the duplicates
+        start_ids = {table: (next(iter(statementcache.execute(f"SELECT MAX(%ID) FROM {table}")))[0] or 0) + 1
+                     for table in list_tables}
 
+    if m>0:
+        start = time.time()
+        if bulk:
+            for table in list_tables:
+                total = duplicate_rows(n,table,times=m)
+                if rows is not None:
+                    rows[table] = total
+        else:
+            for i in range(m):
+                print(f"\r{(i+1)/m*100:.1f}%", end='')
+                for table in list_tables:
+                    total = duplicate_rows(n,table)
+                    if rows is not None:
+                        rows[table] = total
         end = time.time()
+        phases["duplicate"] = end - start
         print(f"\nduplicated a total of {m*n*len(list_tables):,} rows in {end - start:.2f} row per second : {(m*n*len(list_tables))/(end - start):,.2f}")
 
+    # the duplicates aren't indexed, build the indices once they are all there, theirs only after a tuned sample
+    if m>0 or (bulk and not tune_sample):
+        print("build index")
+        start = time.time()
+        build_indices(list_tables, parallel_index, start_ids)
+        phases["build index"] = phases.get("build index", 0) + time.time() - start
+    if (m>0 or bulk) and (not tune_sample or rows):
+        print("tune table" if not tune_sample else "set extent size")
+        start = time.time()
+        tune_tables(list_tables, rows)
+        phases["tune table"] = phases.get("tune table", 0) + time.time() - start
+
+    print(f"{'phase':<12} {'seconds':>10}")
+    for phase, seconds in phases.items():
+        print(f"{phase:<12} {seconds:>10.2f}")
+    return phases
+
 def create_join_table():
     # create a description table of debit and credit
     print("create a description table of debit and credit")